@@ -0,0 +1,244 @@
+import hashlib
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from io import BytesIO
+import soundfile as sf
+import numpy as np
+from audio_analysis import ANALYSIS_DTYPE, FRAME_LENGTH, HOP_LENGTH, CUTOFF_FREQ, THRESHOLD, open_audio_source
+
+HASH_BLOCK_FRAMES = 65536
+
+
+def audio_cache_key(source, frame_length=FRAME_LENGTH, hop_length=HOP_LENGTH,
+                    cutoff_freq=CUTOFF_FREQ, threshold=THRESHOLD, dtype=ANALYSIS_DTYPE):
+    """
+    Content address of a recording: a hash of its decoded samples plus the
+    analysis parameters (including the STFT dtype), so container/header
+    differences do not defeat the cache but a parameter change does
+    """
+    with sf.SoundFile(open_audio_source(source)) as f:
+        header = f"{f.samplerate}:{f.channels}:{f.subtype}:{frame_length}:{hop_length}:{cutoff_freq}:{threshold}:{np.dtype(dtype).name}"
+        digest = hashlib.sha256(header.encode())
+        # Block by block, so hashing a long recording does not hold all its samples
+        for block in f.blocks(blocksize=HASH_BLOCK_FRAMES, dtype='int16'):
+            digest.update(block.tobytes())
+    return digest.hexdigest()
+
+
+def image_variant(name, quality):
+    """
+    Sub-key of a rendered image: the PNG shows the recording's name in its title
+    and IMAGE_QUALITY picks the renderer, so one recording can have several images
+    """
+    return hashlib.sha256(f"{name}:{quality}".encode()).hexdigest()[:16]
+
+
+class AnalysisCache:
+    """
+    Cache of analyze_audio results keyed by audio_cache_key, plus the PNGs rendered
+    from them keyed by image_variant. An in-process LRU tier is bounded by
+    max_bytes; an optional on-disk tier (disk_dir) is bounded by disk_max_bytes
+    and evicts least recently used recordings, with all their images, by mtime.
+    Thread-safe, so it can be called through asyncio.to_thread. The lock only
+    guards the memory tier; disk reads and writes happen outside it.
+    """
+
+    def __init__(self, max_bytes, disk_dir=None, disk_max_bytes=0):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # Disk usage is counted as entries are written and only rescanned to evict
+        # (which is also when writes by other processes sharing disk_dir are seen)
+        self._disk_bytes = 0
+        self._disk_lock = threading.Lock()
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._disk_bytes = sum(size for _, size, _ in self._disk_entries().values())
+
+    def get(self, key, variant=None, needs_image=None):
+        """
+        Return (analysis_results, image_bytes) or None; image_bytes is the PNG
+        stored under variant, or None when there is none. needs_image(results)
+        says whether a lookup without the image is of no use to the caller: it
+        then returns None and counts as a miss, since the clip is analyzed again.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        tier = 'memory'
+
+        if entry is None:
+            entry = self._disk_get(key, variant)
+            tier = 'disk'
+        elif variant is not None and variant not in entry[1]:
+            # The image may have been evicted from memory but still be on disk
+            png = self._disk_get_png(key, variant)
+            if png is not None:
+                entry = self._merge(entry, variant, png)
+                tier = 'disk'
+
+        result = self._unpack(entry, variant) if entry is not None else None
+        if result is not None and result[1] is None and needs_image is not None and needs_image(result[0]):
+            result = None
+
+        with self._lock:
+            if result is None:
+                self.misses += 1
+            elif tier == 'memory':
+                self.hits += 1
+            else:
+                self.disk_hits += 1
+                self._memory_put(key, entry)
+        return result
+
+    def put(self, key, analysis_results, image_bytes=None, variant=None):
+        results_json = json.dumps(analysis_results).encode()
+        png = image_bytes.getvalue() if image_bytes is not None and variant is not None else None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == results_json:
+                entry = self._merge(entry, variant, png) if png is not None else entry
+            else:
+                entry = (results_json, {variant: png} if png is not None else {})
+            self._memory_put(key, entry)
+        self._disk_put(key, results_json, variant, png)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'disk_bytes': self._disk_bytes
+            }
+
+    @staticmethod
+    def _unpack(entry, variant):
+        results_json, pngs = entry
+        png = pngs.get(variant)
+        return json.loads(results_json), (BytesIO(png) if png is not None else None)
+
+    @staticmethod
+    def _merge(entry, variant, png):
+        results_json, pngs = entry
+        return results_json, {**pngs, variant: png}
+
+    @staticmethod
+    def _entry_size(entry):
+        results_json, pngs = entry
+        return len(results_json) + sum(len(png) for png in pngs.values())
+
+    def _memory_put(self, key, entry):
+        size = self._entry_size(entry)
+        if size > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= self._entry_size(old)
+        self._entries[key] = entry
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= self._entry_size(evicted)
+
+    def _json_path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _png_path(self, key, variant):
+        return os.path.join(self.disk_dir, f"{key}.{variant}.png")
+
+    def _disk_get(self, key, variant):
+        if not self.disk_dir:
+            return None
+        json_path = self._json_path(key)
+        try:
+            with open(json_path, 'rb') as f:
+                results_json = f.read()
+            os.utime(json_path)
+        except OSError:
+            return None
+        png = self._disk_get_png(key, variant) if variant is not None else None
+        return results_json, ({variant: png} if png is not None else {})
+
+    def _disk_get_png(self, key, variant):
+        if not self.disk_dir:
+            return None
+        png_path = self._png_path(key, variant)
+        try:
+            with open(png_path, 'rb') as f:
+                png = f.read()
+            os.utime(png_path)
+        except OSError:
+            return None
+        return png
+
+    def _disk_put(self, key, results_json, variant, png):
+        if not self.disk_dir or len(results_json) + (len(png) if png else 0) > self.disk_max_bytes:
+            return
+        try:
+            # PNG first, JSON last: a readable JSON file marks a complete entry
+            added = 0
+            if png is not None:
+                added += self._write_atomic(self._png_path(key, variant), png)
+            added += self._write_atomic(self._json_path(key), results_json)
+        except OSError as e:
+            print(f"Error writing analysis cache entry: {e}")
+            return
+        with self._disk_lock:
+            self._disk_bytes += added
+            if self._disk_bytes > self.disk_max_bytes:
+                self._disk_evict()
+
+    @staticmethod
+    def _write_atomic(path, content):
+        """Write content to path; returns how many bytes the disk tier grew by"""
+        try:
+            replaced = os.path.getsize(path)
+        except OSError:
+            replaced = 0
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+        return len(content) - replaced
+
+    def _disk_entries(self):
+        # Group the .json and .png files of each key so entries are evicted whole
+        entries = {}
+        for item in os.scandir(self.disk_dir):
+            if item.is_file() and not item.name.endswith('.tmp'):
+                stat = item.stat()
+                key = item.name.split('.', 1)[0]
+                mtime, size, paths = entries.get(key, (0, 0, []))
+                entries[key] = (max(mtime, stat.st_mtime), size + stat.st_size, paths + [item.path])
+        return entries
+
+    def _disk_evict(self):
+        # Called with _disk_lock held, only once the tier is over its limit
+        entries = self._disk_entries()
+        total = sum(size for _, size, _ in entries.values())
+        for mtime, size, paths in sorted(entries.values()):
+            if total <= self.disk_max_bytes:
+                break
+            for path in paths:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= size
+        self._disk_bytes = total
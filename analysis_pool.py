@@ -0,0 +1,83 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+
+class PoolBusyError(Exception):
+    """Raised when the analysis queue is full; callers answer 503 with Retry-After"""
+
+
+class AnalysisPool:
+    """
+    Bounded process pool that keeps CPU-bound audio work (STFT, rendering,
+    resampling) off the Quart event loop.
+
+    max_pending caps the jobs running plus waiting; beyond it run() raises
+    PoolBusyError instead of queueing, so a burst of uploads gets pushed back
+    to the client rather than piling up in memory.
+
+    Workers are started with forkserver (spawn where it is unavailable) unless
+    start_method says otherwise: the web process already runs I/O threads when
+    the pool is created or rebuilt, and forking it could leave a worker stuck
+    on a lock one of those threads held.
+    """
+
+    def __init__(self, max_workers, max_pending, start_method=None):
+        self.max_workers = max(1, max_workers)
+        self.max_pending = max(self.max_workers, max_pending)
+        if start_method is None:
+            start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        self.start_method = start_method
+        self.pending = 0
+        self._executor = None
+
+    def start(self):
+        if self._executor is None:
+            mp_context = multiprocessing.get_context(self.start_method)
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=mp_context)
+        return self._executor
+
+    def shutdown(self):
+        """Wait for running jobs and stop the workers; blocks, so call it via asyncio.to_thread"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    @property
+    def is_full(self):
+        return self.pending >= self.max_pending
+
+    async def run(self, fn, *args):
+        """
+        Run fn(*args) in a worker process, or raise PoolBusyError if the queue is full.
+        A pool broken by a dead worker is replaced and the call retried once; if that
+        also breaks, PoolBusyError is raised so the client gets a 503 and retries.
+        """
+        if self.is_full:
+            raise PoolBusyError(f"{self.pending} analysis jobs pending (limit {self.max_pending})")
+
+        self.pending += 1
+        try:
+            try:
+                return await self._submit(fn, *args)
+            except BrokenProcessPool:
+                # A worker died (e.g. OOM-killed); replace the pool and retry once
+                print("Analysis pool broken, restarting it")
+                try:
+                    return await self._submit(fn, *args)
+                except BrokenProcessPool as e:
+                    raise PoolBusyError("Analysis worker crashed twice") from e
+        finally:
+            self.pending -= 1
+
+    async def _submit(self, fn, *args):
+        executor = self.start()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+        except BrokenProcessPool:
+            # Concurrent callers share one broken executor; only the first replaces it
+            if self._executor is executor:
+                self._executor = None
+                executor.shutdown(wait=False, cancel_futures=True)
+            raise
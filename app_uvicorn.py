@@ -1,29 +1,34 @@
-import matplotlib
-matplotlib.use('Agg')  # Set the backend to Agg before importing pyplot
-import matplotlib.pyplot as plt
 from io import BytesIO
-from flask import Flask, request, jsonify
-from pymongo import MongoClient
-from flask_cors import CORS
 import os
 from datetime import datetime
 import uuid
+import hashlib
+import json
 import tempfile
 import soundfile as sf
-import numpy as np
-import librosa
-import librosa.display
 import re
 import base64
-import pandas as pd
-import smtplib
 from email.message import EmailMessage
 from dotenv import load_dotenv
-from quart import Quart, request, jsonify
+from quart import Quart, Response, g, request, jsonify, send_file
 from quart_cors import cors
-import threading
-import boto3
-from botocore.exceptions import NoCredentialsError, ClientError
+import asyncio
+import shutil
+from urllib.parse import unquote
+import aiofiles
+import time
+from concurrent.futures import ThreadPoolExecutor
+from audio_analysis import analyze_and_render, image_required, open_audio_source, warm_up
+from resampling import resample_audio
+from analysis_pool import AnalysisPool, PoolBusyError
+from analysis_cache import AnalysisCache, audio_cache_key, image_variant
+from mongo_store import AsyncCollection, BulkWriter, create_io_executor, create_mongo_client, ensure_indexes
+from itn_sequence import MongoSequenceCounter, SQLiteSequenceCounter, highest_itn_sequence
+from job_queue import JobQueue, JobWorkers, PermanentJobError
+from mailer import SMTPMailer
+from deferred import Deferred
+from metrics import (REQUEST_SECONDS, REQUESTS_IN_FLIGHT, monitor_event_loop_lag, observe_stage,
+                     render_metrics, stage_timer)
 
 app = Quart(__name__)
 app = cors(app, allow_origin="*")  # Replace Flask-CORS with Quart-CORS
@@ -44,188 +49,503 @@ AWS_ACCESS_KEY_ID = os.getenv('AWS_ACCESS_KEY_ID')
 AWS_SECRET_ACCESS_KEY = os.getenv('AWS_SECRET_ACCESS_KEY')
 AWS_REGION = os.getenv('AWS_REGION', 'us-east-1')
 S3_BUCKET_NAME = 'audio-sourcing-itn'
+# Point at a local S3 stand-in (e.g. moto_server or MinIO) for offline testing
+S3_ENDPOINT_URL = os.getenv('S3_ENDPOINT_URL') or None
 
-# Initialize S3 client
-s3_client = boto3.client(
-    's3',
-    aws_access_key_id=AWS_ACCESS_KEY_ID,
-    aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-    region_name=AWS_REGION
-)
+# S3 transfer tuning: one shared client (boto3 clients are thread-safe) with a
+# connection pool large enough for the upload threads and multipart parts
+S3_UPLOAD_THREADS = int(os.getenv("S3_UPLOAD_THREADS", 8))
+S3_MAX_CONCURRENCY = int(os.getenv("S3_MAX_CONCURRENCY", 4))
+S3_MULTIPART_THRESHOLD = int(os.getenv("S3_MULTIPART_THRESHOLD", 8 * 1024 * 1024))
+S3_MULTIPART_CHUNKSIZE = int(os.getenv("S3_MULTIPART_CHUNKSIZE", 8 * 1024 * 1024))
+S3_MAX_POOL_CONNECTIONS = int(os.getenv("S3_MAX_POOL_CONNECTIONS", S3_UPLOAD_THREADS * S3_MAX_CONCURRENCY))
+
+
+def create_s3_client():
+    import boto3
+    from botocore.config import Config as BotoConfig
+
+    return boto3.client(
+        's3',
+        aws_access_key_id=AWS_ACCESS_KEY_ID,
+        aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+        region_name=AWS_REGION,
+        endpoint_url=S3_ENDPOINT_URL,
+        config=BotoConfig(max_pool_connections=S3_MAX_POOL_CONNECTIONS, retries={'mode': 'standard'})
+    )
+
+
+def create_s3_transfer_config():
+    from boto3.s3.transfer import TransferConfig
+
+    return TransferConfig(
+        multipart_threshold=S3_MULTIPART_THRESHOLD,
+        multipart_chunksize=S3_MULTIPART_CHUNKSIZE,
+        max_concurrency=S3_MAX_CONCURRENCY
+    )
+
+
+# S3 client, built on first use (boto3 is only imported then)
+s3_client = Deferred(create_s3_client)
+s3_transfer_config = Deferred(create_s3_transfer_config)
+s3_executor = ThreadPoolExecutor(max_workers=S3_UPLOAD_THREADS, thread_name_prefix="s3-upload")
 
 EMAIL_RECIPIENT = [email.strip() for email in emails.split(",") if email.strip()]
 
-# MongoDB setup
-client = MongoClient(MONGODB_URL)
-db = client["audioDB"]
-collection = db["trackdata"]
+# Reports go out over one SMTP connection per worker process, reused between reports
+EMAIL_STARTTLS = os.getenv("EMAIL_STARTTLS", "true").lower() != "false"
+mailer = SMTPMailer(EMAIL_SMTP, EMAIL_PORT, EMAIL_USER, EMAIL_PASSWORD, starttls=EMAIL_STARTTLS)
+
+# MongoDB setup (set MONGODB_URI=mongomock:// for an offline in-memory database)
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", 100))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 30000))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", 20000))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", 0)) or None
+MONGO_IO_THREADS = int(os.getenv("MONGO_IO_THREADS", min(32, MONGO_MAX_POOL_SIZE)))
+
+# The client (and pymongo, and the DNS lookups of a mongodb+srv:// URL) is built on first use
+client = Deferred(lambda: create_mongo_client(
+    MONGODB_URL,
+    max_pool_size=MONGO_MAX_POOL_SIZE,
+    server_selection_timeout_ms=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    connect_timeout_ms=MONGO_CONNECT_TIMEOUT_MS,
+    socket_timeout_ms=MONGO_SOCKET_TIMEOUT_MS
+))
+db = Deferred(lambda: client["audioDB"])
+mongo_io_executor = create_io_executor(MONGO_IO_THREADS)
+collection = AsyncCollection(Deferred(lambda: db["trackdata"]), mongo_io_executor)
+
+# New trackdata documents are batched into bulk_write calls (flushed by size or after a short delay)
+MONGO_BULK_MAX_BATCH = int(os.getenv("MONGO_BULK_MAX_BATCH", 100))
+MONGO_BULK_MAX_DELAY_MS = int(os.getenv("MONGO_BULK_MAX_DELAY_MS", 20))
+trackdata_writer = BulkWriter(collection.sync, mongo_io_executor, MONGO_BULK_MAX_BATCH, MONGO_BULK_MAX_DELAY_MS / 1000)
+
+# Indexes behind the recording UI's polling queries, the resave update and the medical job upsert
+TRACKDATA_INDEXES = [
+    [("speakerid", 1), ("country", 1), ("validation_status", 1)],  # /checkdata, /checkfails
+    [("speakerid", 1), ("country", 1), ("re_record", 1)],  # /checkfails re-record check
+    [("speakerid", 1), ("speakerId_sequence", 1), ("name", 1)],  # resave
+    [("submission_id", 1)],  # medical submissions
+]
+
+# Fields the UI never reads from /checkdata and /checkfails (the drop lists make documents large)
+TRACKDATA_LIST_PROJECTION = {"analysis_results": 0}
+
+# ITN sequence counters live in audioDB.counters; ITN_COUNTER_DB=<file> uses a local SQLite file instead
+ITN_COUNTER_DB = os.getenv("ITN_COUNTER_DB")
+itn_counter = SQLiteSequenceCounter(ITN_COUNTER_DB) if ITN_COUNTER_DB else MongoSequenceCounter(Deferred(lambda: db["counters"]))
 
 # Create output folder if not exists
 OUTPUT_FOLDER = "output"
 os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 
-def detect_drops(energy, threshold):
-    """Detect only frame drops (single or double frames above threshold)"""
-    drops = []
-    drop_energy_info = []
-    i = 0
-    while i < len(energy):
-        if energy[i] > threshold:
-            start = i
-            while i < len(energy) and energy[i] > threshold:
-                i += 1
-            length = i - start
-            if length == 1 or length == 2:  # Only detect single/double frame drops
-                drops.append(('drop', start, min(i, len(energy) - 1)))
-                drop_energy_info.append(f"{np.max(energy[start:i]):.2f}")
-        else:
-            i += 1
-    return drops, drop_energy_info
+# Process pool for CPU-bound analysis, rendering and resampling
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", os.cpu_count() or 1))
+ANALYSIS_MAX_PENDING = int(os.getenv("ANALYSIS_MAX_PENDING", ANALYSIS_WORKERS * 4))
+ANALYSIS_RETRY_AFTER = int(os.getenv("ANALYSIS_RETRY_AFTER", 5))
+# forkserver (the default) or spawn; fork is unsafe once the I/O threads are running
+ANALYSIS_START_METHOD = os.getenv("ANALYSIS_START_METHOD") or None
 
-def analyze_audio(filepath):
-    try:
-        # Read audio as int16 to preserve original values
-        audio, sr = sf.read(filepath, dtype='int16')
-        if len(audio.shape) > 1:
-            audio = audio[:, 0]
-
-        # Get audio format info
-        subtype_info = sf.info(filepath).subtype_info
-        bit_depth_match = re.search(r'(\d+)', subtype_info)
-        bit_depth = int(bit_depth_match.group(1)) if bit_depth_match else 16
-
-        # Parameters
-        frame_length = 1024
-        hop_length = 512
-        cutoff_freq = 20000  # 20 kHz
-        threshold = 0.02
-
-        # Calculate STFT
-        D = librosa.amplitude_to_db(
-            np.abs(librosa.stft(audio.astype(float), n_fft=frame_length, hop_length=hop_length)),
-            ref=np.max
-        )
-        frequencies = librosa.fft_frequencies(sr=sr, n_fft=frame_length)
+analysis_pool = AnalysisPool(ANALYSIS_WORKERS, ANALYSIS_MAX_PENDING, ANALYSIS_START_METHOD)
 
-        # Skip if STFT is empty
-        if D.shape[1] == 0:
-            return {
-                'status': 'error',
-                'message': 'STFT result is empty'
-            }
 
-        # Analyze high frequency content
-        high_freq_mask = frequencies >= cutoff_freq
-        D_high_freq = D[high_freq_mask, :]
-        high_freq_energy = np.sum(librosa.db_to_amplitude(D_high_freq), axis=0)
+@app.before_serving
+async def start_analysis_pool():
+    analysis_pool.start()
 
-        # Detect only drops (skip noise detection)
-        drops, drop_energy_info = detect_drops(high_freq_energy, threshold)
-        
-        # Prepare results
-        results = {
-            'max_sample': int(np.max(audio)),
-            'min_sample': int(np.min(audio)),
-            'bit_depth': bit_depth,
-            'sample_rate': sr,
-            'duration': len(audio) / sr,
-            'drops': [],
-            'is_clean': len(drops) == 0  # False if any drops detected
-        }
 
-        # Process drops
-        time_axis = np.linspace(0, len(audio) / sr, len(high_freq_energy))
-        for drop_type, start, end in drops:
-            start_time = time_axis[start] if start < len(time_axis) else time_axis[-1]
-            end_time = time_axis[end] if end < len(time_axis) else time_axis[-1]
-            
-            results['drops'].append({
-                'type': drop_type,
-                'start': float(start_time),
-                'end': float(end_time),
-                'max_energy': drop_energy_info.pop(0) if drop_energy_info else None
-            })
-
-        return results
+@app.after_serving
+async def stop_analysis_pool():
+    await asyncio.to_thread(analysis_pool.shutdown)
 
+
+async def create_trackdata_indexes():
+    try:
+        await asyncio.to_thread(ensure_indexes, collection.sync, TRACKDATA_INDEXES)
     except Exception as e:
-        return {
-            'status': 'error',
-            'message': str(e)
-        }
+        print(f"Error creating trackdata indexes: {e}")
 
-def get_next_itn_sequence(locale):
+
+@app.after_serving
+async def flush_trackdata_writes():
+    await trackdata_writer.flush()
+
+
+def server_busy_response():
+    """503 returned when the analysis pool queue is full"""
+    return (
+        jsonify({'error': 'Server busy, please retry shortly'}),
+        503,
+        {'Retry-After': str(ANALYSIS_RETRY_AFTER)}
+    )
+
+
+# Analysis image quality: 'high' (matplotlib) or 'fast' (direct RGB rendering with Pillow)
+IMAGE_QUALITY = os.getenv("IMAGE_QUALITY", "high")
+
+# Recordings at least this long are analyzed block by block (constant memory, same results)
+ANALYSIS_STREAM_MIN_SECONDS = float(os.getenv("ANALYSIS_STREAM_MIN_SECONDS", 60))
+
+# Content-addressed cache of analysis results and images (disk tier off unless a dir is set)
+ANALYSIS_CACHE_MAX_BYTES = int(os.getenv("ANALYSIS_CACHE_MAX_BYTES", 128 * 1024 * 1024))
+ANALYSIS_CACHE_DIR = os.getenv("ANALYSIS_CACHE_DIR") or None
+ANALYSIS_CACHE_DISK_MAX_BYTES = int(os.getenv("ANALYSIS_CACHE_DISK_MAX_BYTES", 1024 * 1024 * 1024))
+
+analysis_cache = AnalysisCache(ANALYSIS_CACHE_MAX_BYTES, ANALYSIS_CACHE_DIR, ANALYSIS_CACHE_DISK_MAX_BYTES)
+
+
+async def analyze_upload(source, name=None, render=True):
     """
-    Get the next sequence number for ITN files based on existing files in S3
-    Format: audio_countrycode_ITN_sequence (e.g., audio_zh_HK_ITN_0001)
+    analyze_and_render through the analysis cache: byte-identical audio skips all
+    DSP and rendering. Raises PoolBusyError when a miss finds the pool full.
     """
     try:
-        # List objects in both original and modified folders
-        prefix_original = f"original/audio_{locale}_ITN_"
-        prefix_modified = f"modified/audio_{locale}_ITN_"
-        
-        existing_numbers = set()
-        
-        # Check original folder
-        response = s3_client.list_objects_v2(
-            Bucket=S3_BUCKET_NAME,
-            Prefix=prefix_original
+        cache_key = await asyncio.to_thread(audio_cache_key, source)
+    except Exception:
+        cache_key = None  # Undecodable audio; let the analysis report the error
+
+    variant = image_variant(name, IMAGE_QUALITY)
+    if cache_key is not None:
+        cached = await asyncio.to_thread(
+            analysis_cache.get, cache_key, variant, lambda results: image_required(render, results)
         )
-        
-        if 'Contents' in response:
-            for obj in response['Contents']:
-                key = obj['Key']
-                # Extract sequence number from filename
-                match = re.search(r'audio_' + re.escape(locale) + r'_ITN_(\d{4})\.', key)
-                if match:
-                    existing_numbers.add(int(match.group(1)))
-        
-        # Check modified folder
-        response = s3_client.list_objects_v2(
-            Bucket=S3_BUCKET_NAME,
-            Prefix=prefix_modified
+        if cached is not None:
+            return cached
+
+    analysis_results, image_bytes, timings = await analysis_pool.run(
+        analyze_and_render, source, render, name, IMAGE_QUALITY, ANALYSIS_STREAM_MIN_SECONDS
+    )
+    for stage, seconds in timings.items():
+        observe_stage(stage, seconds)
+    if cache_key is not None and analysis_results.get('status') != 'error':
+        await asyncio.to_thread(analysis_cache.put, cache_key, analysis_results, image_bytes, variant)
+    return analysis_results, image_bytes
+
+
+@app.route('/analysis_cache/stats', methods=['GET'])
+async def analysis_cache_stats():
+    return jsonify(analysis_cache.stats()), 200
+
+
+# Startup: nothing heavy is imported or connected at import time. With WARM_UP on, a
+# background task loads the DSP/plotting stack in every analysis worker, builds the S3
+# client and pings MongoDB; /readyz answers 503 until it is done. /healthz is liveness only.
+WARM_UP = os.getenv("WARM_UP", "true").lower() in ("1", "true", "yes")
+WARM_UP_RETRY_SECONDS = float(os.getenv("WARM_UP_RETRY_SECONDS", 5))
+
+readiness = {'analysis': not WARM_UP, 's3': not WARM_UP, 'mongo': not WARM_UP}
+readiness_errors = {}
+warm_up_task = None
+
+
+async def warm_up_check(name, fn, *args, retry=True):
+    """Run one warm-up step, retrying every WARM_UP_RETRY_SECONDS until it succeeds"""
+    while True:
+        start = time.perf_counter()
+        try:
+            await fn(*args)
+            readiness[name] = True
+            readiness_errors.pop(name, None)
+            print(f"Warm-up: {name} ready in {time.perf_counter() - start:.2f}s")
+            return
+        except Exception as e:
+            readiness_errors[name] = str(e)
+            print(f"Warm-up: {name} failed: {e}")
+            if not retry:
+                return
+            await asyncio.sleep(WARM_UP_RETRY_SECONDS)
+
+
+async def warm_up_analysis():
+    # One warm-up per worker; the pool starts its workers on these first submissions
+    await asyncio.gather(*(
+        analysis_pool.run(warm_up, IMAGE_QUALITY) for _ in range(analysis_pool.max_workers)
+    ))
+
+
+async def warm_up_s3():
+    await asyncio.to_thread(s3_client.get)
+    await asyncio.to_thread(s3_transfer_config.get)
+
+
+async def warm_up_mongo():
+    await asyncio.to_thread(client.admin.command, 'ping')
+    await create_trackdata_indexes()
+
+
+async def warm_up_all():
+    start = time.perf_counter()
+    # Analysis first, so the workers are forked before any other thread starts importing
+    await warm_up_check('analysis', warm_up_analysis, retry=False)
+    # A failed analysis warm-up only costs the first request its imports
+    readiness['analysis'] = True
+    await asyncio.gather(warm_up_check('s3', warm_up_s3), warm_up_check('mongo', warm_up_mongo))
+    print(f"Warm-up complete in {time.perf_counter() - start:.2f}s")
+
+
+@app.before_serving
+async def start_warm_up():
+    global warm_up_task
+    warm_up_task = asyncio.create_task(warm_up_all() if WARM_UP else create_trackdata_indexes())
+
+
+@app.after_serving
+async def stop_warm_up():
+    if warm_up_task is not None and not warm_up_task.done():
+        warm_up_task.cancel()
+
+
+@app.route('/healthz', methods=['GET'])
+async def healthz():
+    """Liveness: the process is up and the event loop is answering"""
+    return jsonify({'status': 'ok'}), 200
+
+
+@app.route('/readyz', methods=['GET'])
+async def readyz():
+    """Readiness: 200 once warm-up has finished, 503 with the pending checks before that"""
+    ready = all(readiness.values())
+    body = {'status': 'ready' if ready else 'warming_up', 'checks': readiness}
+    if readiness_errors:
+        body['errors'] = readiness_errors
+    return jsonify(body), 200 if ready else 503
+
+
+# Prometheus metrics: per-stage histograms (recorded in whichever process runs the
+# stage), request latency, in-flight requests per route and event loop lag
+EVENT_LOOP_LAG_INTERVAL = float(os.getenv("EVENT_LOOP_LAG_INTERVAL", 0.5))
+event_loop_lag_task = None
+
+
+@app.before_serving
+async def start_event_loop_lag_monitor():
+    global event_loop_lag_task
+    event_loop_lag_task = asyncio.create_task(monitor_event_loop_lag(EVENT_LOOP_LAG_INTERVAL))
+
+
+@app.after_serving
+async def stop_event_loop_lag_monitor():
+    if event_loop_lag_task is not None:
+        event_loop_lag_task.cancel()
+
+
+@app.before_request
+async def start_request_metrics():
+    # The route template, not the path, so ids do not become label values
+    g.metrics_endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    g.metrics_start = time.perf_counter()
+    REQUESTS_IN_FLIGHT.labels(g.metrics_endpoint).inc()
+
+
+@app.after_request
+async def record_request_metrics(response):
+    if 'metrics_start' in g:
+        REQUEST_SECONDS.labels(g.metrics_endpoint, request.method, response.status_code).observe(
+            time.perf_counter() - g.metrics_start
         )
-        
-        if 'Contents' in response:
-            for obj in response['Contents']:
-                key = obj['Key']
-                # Extract sequence number from filename
-                match = re.search(r'audio_' + re.escape(locale) + r'_ITN_(\d{4})\.', key)
-                if match:
-                    existing_numbers.add(int(match.group(1)))
-        
-        # Find next available number
-        next_number = 1
-        while next_number in existing_numbers:
-            next_number += 1
-            
-        return f"{next_number:04d}"
-        
-    except Exception as e:
-        print(f"Error getting ITN sequence: {e}")
-        # Fallback to timestamp-based sequence
-        return datetime.now().strftime("%H%M")
+    return response
+
+
+@app.teardown_request
+async def end_request_metrics(exc):
+    if 'metrics_endpoint' in g:
+        REQUESTS_IN_FLIGHT.labels(g.metrics_endpoint).dec()
+
+
+@app.route('/metrics', methods=['GET'])
+async def metrics():
+    body, content_type = await asyncio.to_thread(render_metrics)
+    return Response(body, content_type=content_type)
+
+
+# Durable SQLite job queue for the slow side effects of a submission (analysis, resampling,
+# S3 uploads, MongoDB insert) and report emails, run by JOB_WORKERS worker processes.
+# JOB_WORKERS=0 leaves the queue to workers started elsewhere.
+JOB_QUEUE_DB = os.getenv("JOB_QUEUE_DB", os.path.join(OUTPUT_FOLDER, "jobs.sqlite3"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))
+# Retries back off from JOB_BACKOFF_SECONDS, doubling up to JOB_BACKOFF_MAX_SECONDS; the defaults
+# ride out roughly 15-30 minutes of S3/MongoDB outage before a job is parked as dead
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 12))
+JOB_BACKOFF_SECONDS = float(os.getenv("JOB_BACKOFF_SECONDS", 10))
+JOB_BACKOFF_MAX_SECONDS = float(os.getenv("JOB_BACKOFF_MAX_SECONDS", 300))
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", 600))
+# spawn, fork or forkserver; thread keeps the workers in this process (e.g. with mongomock://)
+JOB_START_METHOD = os.getenv("JOB_START_METHOD", "spawn")
+
+# soxr quality preset for sample rate conversion: QQ, LQ, MQ, HQ or VHQ
+RESAMPLE_QUALITY = os.getenv("RESAMPLE_QUALITY", "HQ")
+
+# Uploaded audio waiting for its job, removed once the job has stored it in S3 (or failed permanently)
+JOB_SPOOL_FOLDER = os.path.join(OUTPUT_FOLDER, "jobs")
+os.makedirs(JOB_SPOOL_FOLDER, exist_ok=True)
+
+job_queue = JobQueue(
+    JOB_QUEUE_DB,
+    max_attempts=JOB_MAX_ATTEMPTS,
+    backoff_base=JOB_BACKOFF_SECONDS,
+    backoff_max=JOB_BACKOFF_MAX_SECONDS,
+    lease_seconds=JOB_LEASE_SECONDS
+)
+job_workers = JobWorkers(job_queue, JOB_WORKERS, 'app_uvicorn', JOB_START_METHOD)
+
+
+@app.before_serving
+async def start_job_workers():
+    job_workers.start()
+
+
+@app.after_serving
+async def stop_job_workers():
+    await asyncio.to_thread(job_workers.shutdown)
+
 
-def upload_to_s3(file_path, s3_key, metadata=None):
+@app.route('/jobs/<job_id>', methods=['GET'])
+async def job_status(job_id):
+    """State of a queued job (a medical submission's job id is its submission_id)"""
+    status = await asyncio.to_thread(job_queue.status, job_id)
+    if status is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(status), 200
+
+
+@app.route('/jobs/<job_id>/requeue', methods=['POST'])
+async def requeue_job(job_id):
+    """Run a dead job (one that ran out of attempts, e.g. during an outage) again"""
+    if not await asyncio.to_thread(job_queue.requeue, job_id):
+        return jsonify({'error': 'No dead job with this id'}), 409
+    return jsonify(await asyncio.to_thread(job_queue.status, job_id)), 200
+
+
+# Uploads up to this size are analyzed from memory; larger ones roll over to a temp file
+IN_MEMORY_UPLOAD_LIMIT = int(os.getenv("IN_MEMORY_UPLOAD_LIMIT", 64 * 1024 * 1024))
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+
+class AudioSpool:
     """
-    Upload a file to S3 bucket
+    Collect an uploaded recording in memory, rolling over to a temp file once it
+    grows past IN_MEMORY_UPLOAD_LIMIT. source is what the analysis pool receives:
+    the WAV bytes, or the temp file path after a rollover. discard() is safe to
+    call more than once and belongs in a finally block.
     """
+
+    def __init__(self, limit=IN_MEMORY_UPLOAD_LIMIT):
+        self.limit = limit
+        self.size = 0
+        self.path = None
+        self._buffer = bytearray()
+        self._bytes = None
+        self._file = None
+
+    async def write(self, chunk):
+        self.size += len(chunk)
+        if self._file is None and self.size > self.limit:
+            self.path = os.path.join(tempfile.gettempdir(), f"{uuid.uuid4()}.wav")
+            self._file = await aiofiles.open(self.path, "wb")
+            await self._file.write(self._bytes if self._bytes is not None else self._buffer)
+            self._buffer = bytearray()
+            self._bytes = None
+        if self._file is not None:
+            await self._file.write(chunk)
+        elif self._bytes is None and not self._buffer and isinstance(chunk, bytes):
+            # A recording that arrives in one piece (spool_bytes) is kept as is, not copied
+            self._bytes = chunk
+        else:
+            if self._bytes is not None:
+                self._buffer += self._bytes
+                self._bytes = None
+            self._buffer += chunk
+
+    async def extend(self, chunks):
+        async for chunk in chunks:
+            await self.write(chunk)
+        await self.close()
+
+    async def close(self):
+        if self._file is not None:
+            await self._file.close()
+            self._file = None
+
+    @property
+    def source(self):
+        if self.path:
+            return self.path
+        if self._bytes is None:
+            # Built once, and the buffer released, so the upload is held in memory only once
+            self._bytes = bytes(self._buffer)
+            self._buffer = bytearray()
+        return self._bytes
+
+    def discard(self):
+        self._buffer = bytearray()
+        self._bytes = None
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+async def iter_file_storage(file_storage):
+    """Read an uploaded multipart file in chunks, off the event loop (it may be spooled to disk)"""
+    while True:
+        chunk = await asyncio.to_thread(file_storage.stream.read, UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        yield chunk
+
+
+async def spool_bytes(audio_bytes):
+    spool = AudioSpool()
+    await spool.write(audio_bytes)
+    await spool.close()
+    return spool
+
+
+def get_next_itn_sequence(locale):
+    """
+    Allocate the next sequence number for ITN files from the per-locale counter
+    Format: audio_countrycode_ITN_sequence (e.g., audio_zh_HK_ITN_0001)
+    The counter is seeded once from the files already in S3; after that each
+    allocation is one atomic round trip, so concurrent submissions never collide.
+    """
+    next_number = itn_counter.next(
+        f"itn:{locale}",
+        lambda: highest_itn_sequence(s3_client, S3_BUCKET_NAME, locale)
+    )
+    return f"{next_number:04d}"
+
+def upload_to_s3(source, s3_key, metadata=None):
+    """
+    Upload to S3 bucket from a file path, bytes or a file-like object
+    (bytes and buffers are streamed with upload_fileobj, no temp file needed)
+    """
+    from botocore.exceptions import NoCredentialsError
+
     try:
         extra_args = {}
         if metadata:
             extra_args['Metadata'] = metadata
-            
-        s3_client.upload_file(
-            file_path,
-            S3_BUCKET_NAME,
-            s3_key,
-            ExtraArgs=extra_args
-        )
+
+        if isinstance(source, (str, os.PathLike)):
+            s3_client.upload_file(
+                source,
+                S3_BUCKET_NAME,
+                s3_key,
+                ExtraArgs=extra_args,
+                Config=s3_transfer_config.get()
+            )
+        else:
+            fileobj = BytesIO(source) if isinstance(source, (bytes, bytearray, memoryview)) else source
+            s3_client.upload_fileobj(
+                fileobj,
+                S3_BUCKET_NAME,
+                s3_key,
+                ExtraArgs=extra_args,
+                Config=s3_transfer_config.get()
+            )
         
         return f"s3://{S3_BUCKET_NAME}/{s3_key}"
         
     except FileNotFoundError:
-        print(f"File {file_path} not found")
+        print(f"File {source} not found")
         return None
     except NoCredentialsError:
         print("AWS credentials not available")
@@ -255,147 +575,291 @@ def upload_json_to_s3(json_data, s3_key):
         print(f"Error uploading JSON to S3: {e}")
         return None
 
-def generate_analysis_image(filepath, drops=None):
-    try:
-        # Read audio
-        audio, sr = sf.read(filepath, dtype='int16')
-        if len(audio.shape) > 1:
-            audio = audio[:, 0]
-
-        # Parameters
-        frame_length = 1024
-        hop_length = 512
-        cutoff_freq = 20000  # 20 kHz
-        threshold = 0.02
-
-        # Calculate STFT
-        D = librosa.amplitude_to_db(
-            np.abs(librosa.stft(audio.astype(float), n_fft=frame_length, hop_length=hop_length)),
-            ref=np.max
-        )
-        frequencies = librosa.fft_frequencies(sr=sr, n_fft=frame_length)
-        high_freq_mask = frequencies >= cutoff_freq
-        D_high_freq = D[high_freq_mask, :]
-        high_freq_energy = np.sum(librosa.db_to_amplitude(D_high_freq), axis=0)
-
-        # Create figure with larger size
-        fig, ax = plt.subplots(2, 1, figsize=(14, 8), sharex=True)
-
-        # Spectrogram (bottom subplot)
-        img = librosa.display.specshow(D, sr=sr, hop_length=hop_length, 
-                                     x_axis='time', y_axis='linear', ax=ax[1])
-        fig.colorbar(img, ax=ax[1], format="%+2.0f dB", label='Amplitude (dB)')
-        ax[1].set_ylabel('Frequency (Hz)', fontsize=12)
-        ax[1].set_xlabel('Time (s)', fontsize=12)
-
-        # High frequency energy plot (top subplot)
-        time_axis = np.linspace(0, len(audio)/sr, len(high_freq_energy))
-        
-        # Plot energy and threshold
-        ax[0].plot(time_axis, high_freq_energy, color='red', linewidth=2, 
-                  alpha=0.8, label='High-Freq Energy (20k+ Hz)')
-        ax[0].axhline(threshold, color='blue', linestyle='--', 
-                     linewidth=1.5, alpha=0.7, label=f'Threshold ({threshold:.2f})')
-        
-        # Mark drop regions if provided
-        if drops:
-            for drop in drops:
-                start_time = drop['start']
-                end_time = drop['end']
-                ax[0].axvspan(start_time, end_time, color='blue', alpha=0.3, label='Frame Drop')
-        
-        # Customize the energy plot
-        ax[0].set_ylabel('Energy', color='red', fontsize=12)
-        ax[0].tick_params(axis='y', labelcolor='red')
-        ax[0].grid(True, alpha=0.3)
-        
-        # Add title with filename
-        filename = os.path.basename(filepath).replace('.wav', '')
-        fig.suptitle(f"Audio Analysis: {filename}", fontsize=14, y=1.02)
-        
-        # Create a unified legend
-        handles, labels = [], []
-        for a in [ax[0], ax[1]]:
-            h, l = a.get_legend_handles_labels()
-            handles.extend(h)
-            labels.extend(l)
-        
-        # Remove duplicate labels
-        unique = [(h, l) for i, (h, l) in enumerate(zip(handles, labels)) 
-                  if l not in labels[:i]]
-        fig.legend(*zip(*unique), loc='upper right', bbox_to_anchor=(1.0, 1.0), 
-                  fontsize=10, framealpha=1)
-
-        # Save to bytes
-        img_bytes = BytesIO()
-        plt.tight_layout()
-        plt.savefig(img_bytes, format='png', bbox_inches='tight', dpi=120)
-        plt.close(fig)
-        img_bytes.seek(0)
-        
-        return img_bytes
 
-    except Exception as e:
-        print(f"Error generating analysis image: {e}")
-        return None
-    
-@app.route('/save_audio', methods=['POST'])
-async def save_audio():
-    try:
-        print('save_audio request---> Request')
+async def upload_concurrently(uploads):
+    """
+    Run several S3 uploads at once on the S3 upload threads, off the event loop.
+    uploads maps a name to (upload_function, *args).
+    Returns ({name: s3_path or None}, {name: seconds taken}).
+    """
+    loop = asyncio.get_running_loop()
+
+    async def timed(fn, *args):
+        start = time.perf_counter()
+        result = await loop.run_in_executor(s3_executor, fn, *args)
+        return result, time.perf_counter() - start
+
+    names = list(uploads)
+    outcomes = await asyncio.gather(*(timed(*uploads[name]) for name in names))
+    s3_paths = {name: result for name, (result, _) in zip(names, outcomes)}
+    timings = {name: elapsed for name, (_, elapsed) in zip(names, outcomes)}
+    for name in names:
+        observe_stage(f"s3_upload_{name}", timings[name])
+        print(f"S3 upload {name}: {timings[name] * 1000:.0f} ms -> {s3_paths[name]}")
+    return s3_paths, timings
+
+
+# When analysis images are rendered for /save_audio and /resave_audio:
+#   eager      - every take, inline (the original behaviour)
+#   failed     - takes with drops inline; clean takes on first GET /analysis_image/<name>
+#   background - like failed, but clean takes are also rendered right after the response
+IMAGE_RENDER_MODE = os.getenv("IMAGE_RENDER_MODE", "failed")
+IMAGE_RENDER = True if IMAGE_RENDER_MODE == "eager" else "failed"
+
+# Audio of takes whose image is deferred, kept until the image is rendered. Most of those
+# images are never asked for, so every PENDING_IMAGE_PRUNE_SECONDS the audio is removed once
+# older than PENDING_IMAGE_MAX_AGE_HOURS, and oldest first while the folder is over
+# PENDING_IMAGE_MAX_BYTES. A pruned take leaves an .expired marker: its image answers 410
+# and its name is not handed out again.
+PENDING_IMAGE_FOLDER = os.path.join(OUTPUT_FOLDER, "pending")
+os.makedirs(PENDING_IMAGE_FOLDER, exist_ok=True)
+PENDING_IMAGE_MAX_AGE_HOURS = float(os.getenv("PENDING_IMAGE_MAX_AGE_HOURS", 72))
+PENDING_IMAGE_MAX_BYTES = int(os.getenv("PENDING_IMAGE_MAX_BYTES", 2 * 1024 * 1024 * 1024))
+PENDING_IMAGE_PRUNE_SECONDS = float(os.getenv("PENDING_IMAGE_PRUNE_SECONDS", 600))
+
+_image_renders = {}
+_background_renders = set()
+pending_prune_task = None
+
+
+def pending_audio_path(image_path):
+    image_name = os.path.splitext(os.path.basename(image_path))[0]
+    return os.path.join(PENDING_IMAGE_FOLDER, f"{image_name}.wav")
+
+
+def expired_marker_path(image_path):
+    return os.path.splitext(pending_audio_path(image_path))[0] + ".expired"
+
+
+def prune_pending_audio(in_use=()):
+    """Remove pending audio past the age or size limit (except paths in in_use); returns how many"""
+    entries = []
+    for item in os.scandir(PENDING_IMAGE_FOLDER):
+        if item.is_file() and item.name.endswith('.wav') and item.path not in in_use:
+            stat = item.stat()
+            entries.append((stat.st_mtime, stat.st_size, item.path))
+    entries.sort()
+
+    total = sum(size for _, size, _ in entries)
+    cutoff = time.time() - PENDING_IMAGE_MAX_AGE_HOURS * 3600
+    removed = 0
+    for mtime, size, path in entries:
+        if mtime >= cutoff and total <= PENDING_IMAGE_MAX_BYTES:
+            break
+        # Marker first, so the name stays taken even if the removal is interrupted
+        open(os.path.splitext(path)[0] + ".expired", 'w').close()
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    return removed
 
-        # Parse JSON data
+
+async def prune_pending_audio_forever():
+    while True:
         try:
-            data = await request.get_json()
+            in_use = {pending_audio_path(image_path) for image_path in _image_renders}
+            removed = await asyncio.to_thread(prune_pending_audio, in_use)
+            if removed:
+                print(f"Pruned the pending audio of {removed} deferred images")
         except Exception as e:
-            print(f"Error parsing JSON: {e}")
-            return jsonify({'error': 'Invalid JSON data'}), 400
+            print(f"Error pruning pending audio: {e}")
+        await asyncio.sleep(PENDING_IMAGE_PRUNE_SECONDS)
 
-        if not data:
-            return jsonify({'error': 'Invalid data'}), 400
 
-        data_uri = data.get("dataURI")
-        if not data_uri:
-            print(f"No audio data found in keys: {list(data.keys())}")
-            return jsonify({'error': 'No audio data received'}), 400
+@app.before_serving
+async def start_pending_audio_pruning():
+    global pending_prune_task
+    pending_prune_task = asyncio.create_task(prune_pending_audio_forever())
 
-        # Decode and save temp audio file
-        header, encoded = data_uri.split(",", 1)
-        audio_bytes = base64.b64decode(encoded)
-        temp_filename = f"{uuid.uuid4()}.wav"
-        temp_path = os.path.join(tempfile.gettempdir(), temp_filename)
 
-        with open(temp_path, "wb") as f:
-            f.write(audio_bytes)
+@app.after_serving
+async def stop_pending_audio_pruning():
+    if pending_prune_task is not None:
+        pending_prune_task.cancel()
+
+
+def reserve_image_path(speaker_id_sequence):
+    """Pick a free output/<sequence>[_n].png name; deferred and expired images count as taken"""
+    image_filename = f"{speaker_id_sequence}.png"
+    image_path = os.path.join(OUTPUT_FOLDER, image_filename)
+
+    # Handle duplicate filenames
+    counter = 1
+    while (os.path.exists(image_path) or os.path.exists(pending_audio_path(image_path))
+           or os.path.exists(expired_marker_path(image_path))):
+        image_filename = f"{speaker_id_sequence}_{counter}.png"
+        image_path = os.path.join(OUTPUT_FOLDER, image_filename)
+        counter += 1
+    return image_path
+
+
+async def save_analysis_image(image_path, image_bytes, spool):
+    """Write a rendered image, or keep the take's audio so the image can be rendered later"""
+    if image_bytes:
+        with open(image_path, 'wb') as f:
+            f.write(image_bytes.getvalue())
+        return
+
+    pending_path = pending_audio_path(image_path)
+    if spool.path:
+        await asyncio.to_thread(shutil.move, spool.path, pending_path)
+        spool.path = None
+    else:
+        async with aiofiles.open(pending_path, 'wb') as f:
+            await f.write(spool.source)
+
+    if IMAGE_RENDER_MODE == "background":
+        task = asyncio.create_task(render_deferred_image(image_path))
+        _background_renders.add(task)
+        task.add_done_callback(_background_renders.discard)
 
-        # Analyze the audio
-        analysis_results = analyze_audio(temp_path)
+
+async def render_deferred_image(image_path):
+    """
+    Render a deferred image from its pending audio, at most once at a time per image.
+    Returns the image path, or None if there is nothing to render.
+    Raises PoolBusyError when the analysis pool is full.
+    """
+    task = _image_renders.get(image_path)
+    if task is None:
+        task = asyncio.ensure_future(_render_pending_image(image_path))
+        _image_renders[image_path] = task
+        task.add_done_callback(lambda _: _image_renders.pop(image_path, None))
+    return await asyncio.shield(task)
+
+
+async def _render_pending_image(image_path):
+    if os.path.exists(image_path):
+        return image_path
+    pending_path = pending_audio_path(image_path)
+    if not os.path.exists(pending_path):
+        return None
+
+    image_name = os.path.splitext(os.path.basename(image_path))[0]
+    analysis_results, image_bytes = await analyze_upload(pending_path, image_name, render=True)
+    if not image_bytes:
+        print(f"Error rendering deferred image {image_path}: {analysis_results.get('message')}")
+        return None
+
+    async with aiofiles.open(image_path, 'wb') as f:
+        await f.write(image_bytes.getvalue())
+    os.remove(pending_path)
+    return image_path
+
+
+@app.route('/analysis_image/<image_name>', methods=['GET'])
+async def analysis_image(image_name):
+    """Serve an analysis image, rendering and storing it on first request if it was deferred"""
+    image_name = os.path.basename(image_name)
+    if not image_name.endswith('.png'):
+        image_name = f"{image_name}.png"
+    image_path = os.path.join(OUTPUT_FOLDER, image_name)
+
+    try:
+        rendered_path = await render_deferred_image(image_path)
+    except PoolBusyError:
+        return server_busy_response()
+    except Exception as e:
+        print(f"Error serving analysis image: {e}")
+        return jsonify({'error': 'Failed to generate analysis image'}), 500
+
+    if rendered_path is None:
+        if os.path.exists(expired_marker_path(image_path)):
+            return jsonify({'error': 'Image expired: it was never rendered and its audio has been pruned'}), 410
+        return jsonify({'error': 'Image not found'}), 404
+    return await send_file(rendered_path, mimetype='image/png')
+
+
+async def save_recording(data, spool):
+    """
+    Analyze an uploaded recording held in an AudioSpool, save (or defer) its image and
+    insert a new trackdata document. Errors propagate to the calling route.
+    """
+    speaker_id_sequence = data.get("speakerId_sequence", "unknown")
+    try:
+        # Analyze the audio in the analysis pool, rendering its image per IMAGE_RENDER_MODE
+        try:
+            analysis_results, image_bytes = await analyze_upload(spool.source, speaker_id_sequence, IMAGE_RENDER)
+        except PoolBusyError:
+            return server_busy_response()
         if analysis_results.get('status') == 'error':
             return jsonify({'error': analysis_results['message']}), 400
 
-        # Generate image from analysis
-        image_bytes = generate_analysis_image(temp_path, analysis_results.get('drops'))
-        if not image_bytes:
+        if not image_bytes and image_required(IMAGE_RENDER, analysis_results):
             return jsonify({'error': 'Failed to generate analysis image'}), 500
 
         # Save image file
-        speaker_id_sequence = data.get("speakerId_sequence", "unknown")
-        image_filename = f"{speaker_id_sequence}.png"
-        image_path = os.path.join(OUTPUT_FOLDER, image_filename)
+        image_path = reserve_image_path(speaker_id_sequence)
+        await save_analysis_image(image_path, image_bytes, spool)
+    finally:
+        spool.discard()
+
+    # Prepare data for MongoDB
+    audio_data = {
+        "speakerid": data.get("speakerId"),
+        "name": data.get("name"),
+        "gender": data.get("gender"),
+        "age": data.get("age"),
+        "country": data.get("country"),
+        "speakerId_sequence": speaker_id_sequence,
+        "speed": data.get("speed"),
+        "text": data.get("text"),
+        "validation_status": analysis_results['is_clean'],
+        "update": datetime.now().strftime("%d-%m-%Y-%H:%M:%S"),
+        "image_path": image_path,
+        "re_record":0,
+        "analysis_results": {
+            "drops": analysis_results['drops'],
+            "drop_count": len(analysis_results['drops']),
+            "is_clean": analysis_results['is_clean'],
+            "max_sample": analysis_results['max_sample'],
+            "min_sample": analysis_results['min_sample'],
+            "bit_depth": analysis_results['bit_depth'],
+            "sample_rate": analysis_results['sample_rate'],
+            "duration": analysis_results['duration']
+        }
+    }
 
-        counter = 1
-        while os.path.exists(image_path):
-            image_filename = f"{speaker_id_sequence}_{counter}.png"
-            image_path = os.path.join(OUTPUT_FOLDER, image_filename)
-            counter += 1
+    # Insert into MongoDB (batched with concurrent submissions, returns once acknowledged)
+    with stage_timer('mongo_write'):
+        await trackdata_writer.insert_one(audio_data)
+    print('Data Successfully Added')
+    return jsonify({'message': 'Data saved successfully'})
 
-        with open(image_path, 'wb') as f:
-            f.write(image_bytes.getvalue())
 
-        # Delete temporary audio file
-        os.remove(temp_path)
+async def resave_recording(data, spool):
+    """
+    Analyze a re-recorded upload held in an AudioSpool, save its image and
+    update the matching trackdata document, incrementing re_record.
+    """
+    speaker_id_sequence = data.get("speakerId_sequence", "unknown")
+    try:
+        # Analyze audio in the analysis pool, rendering the drop image per IMAGE_RENDER_MODE
+        try:
+            analysis_results, image_bytes = await analyze_upload(spool.source, speaker_id_sequence, IMAGE_RENDER)
+        except PoolBusyError:
+            return server_busy_response()
+        if analysis_results.get('status') == 'error':
+            return jsonify({'error': analysis_results['message']}), 400
 
-        # Prepare data for MongoDB
+        if not image_bytes and image_required(IMAGE_RENDER, analysis_results):
+            return jsonify({'error': 'Failed to generate analysis image'}), 500
+
+        # Save image with speakerId_sequence as filename
+        image_path = reserve_image_path(speaker_id_sequence)
+        await save_analysis_image(image_path, image_bytes, spool)
+
+    except Exception as e:
+        print(f"Error processing audio: {e}")
+        return jsonify({'error': 'Audio processing failed'}), 500
+    finally:
+        spool.discard()
+
+    try:
+        # Build the audio data dictionary without re_record
         audio_data = {
             "speakerid": data.get("speakerId"),
             "name": data.get("name"),
@@ -408,7 +872,6 @@ async def save_audio():
             "validation_status": analysis_results['is_clean'],
             "update": datetime.now().strftime("%d-%m-%Y-%H:%M:%S"),
             "image_path": image_path,
-            "re_record":0,
             "analysis_results": {
                 "drops": analysis_results['drops'],
                 "drop_count": len(analysis_results['drops']),
@@ -421,10 +884,62 @@ async def save_audio():
             }
         }
 
-        # Insert into MongoDB
-        result = collection.insert_one(audio_data)
-        print('Data Successfully Added')
-        return jsonify({'message': 'Data saved successfully'})
+        # Update and increment re_record by 1 in one atomic round trip
+        with stage_timer('mongo_write'):
+            updated_doc = await collection.find_one_and_update(
+                {
+                    "speakerId_sequence": speaker_id_sequence,
+                    "speakerid": data.get("speakerId"),
+                    "name": data.get("name"),
+                },
+                {
+                    "$set": audio_data,
+                    "$inc": {"re_record": 1}
+                },
+                projection={"_id": 1}
+            )
+
+        if updated_doc:
+            print('Data updated successfully')
+            return jsonify({'message': 'Data updated successfully'})
+        else:
+            print('No matching document found to update')
+            return jsonify({'message': 'No matching document found'}), 404
+
+    except Exception as e:
+        print(f'Error updating data: {e}')
+        return jsonify({'error': 'Failed to update data', 'details': str(e)}), 500
+
+
+@app.route('/save_audio', methods=['POST'])
+async def save_audio():
+    try:
+        print('save_audio request---> Request')
+
+        # Parse JSON data
+        try:
+            with stage_timer('body_parse'):
+                data = await request.get_json()
+        except Exception as e:
+            print(f"Error parsing JSON: {e}")
+            return jsonify({'error': 'Invalid JSON data'}), 400
+
+        if not data:
+            return jsonify({'error': 'Invalid data'}), 400
+
+        data_uri = data.get("dataURI")
+        if not data_uri:
+            print(f"No audio data found in keys: {list(data.keys())}")
+            return jsonify({'error': 'No audio data received'}), 400
+
+        # Decode audio (kept in memory unless it is very large)
+        header, encoded = data_uri.split(",", 1)
+        with stage_timer('base64_decode'):
+            audio_bytes = base64.b64decode(encoded)
+        with stage_timer('temp_write'):
+            spool = await spool_bytes(audio_bytes)
+
+        return await save_recording(data, spool)
 
     except Exception as e:
         print(f"Unexpected error in save_audio: {e}")
@@ -436,7 +951,8 @@ async def resave_audio():
     print('resave_audio request---> Request')
     try:
         # Use await to properly get the JSON data
-        data = await request.get_json()
+        with stage_timer('body_parse'):
+            data = await request.get_json()
     except Exception as e:
         print(f"Error parsing JSON: {e}")
         return jsonify({'error': 'Invalid JSON data'}), 400
@@ -451,106 +967,100 @@ async def resave_audio():
 
 
     try:
-        # Decode audio
+        # Decode audio (kept in memory unless it is very large)
         header, encoded = data_uri.split(",", 1)
-        audio_bytes = base64.b64decode(encoded)
-        temp_filename = f"{uuid.uuid4()}.wav"
-        temp_path = os.path.join(tempfile.gettempdir(), temp_filename)
+        with stage_timer('base64_decode'):
+            audio_bytes = base64.b64decode(encoded)
+        with stage_timer('temp_write'):
+            spool = await spool_bytes(audio_bytes)
 
-        with open(temp_path, "wb") as f:
-            f.write(audio_bytes)
+    except Exception as e:
+        print(f"Error processing audio: {e}")
+        return jsonify({'error': 'Audio processing failed'}), 500
 
-        # Analyze audio
-        analysis_results = analyze_audio(temp_path)
-        if analysis_results.get('status') == 'error':
-            return jsonify({'error': analysis_results['message']}), 400
+    return await resave_recording(data, spool)
 
-        # Generate analysis image with drop markings
-        image_bytes = generate_analysis_image(temp_path, analysis_results.get('drops'))
-        if not image_bytes:
-            return jsonify({'error': 'Failed to generate analysis image'}), 500
 
-        # Save image with speakerId_sequence as filename
-        speaker_id_sequence = data.get("speakerId_sequence", "unknown")
-        image_filename = f"{speaker_id_sequence}.png"
-        image_path = os.path.join(OUTPUT_FOLDER, image_filename)
-        
-        # Handle duplicate filenames
-        counter = 1
-        while os.path.exists(image_path):
-            image_filename = f"{speaker_id_sequence}_{counter}.png"
-            image_path = os.path.join(OUTPUT_FOLDER, image_filename)
-            counter += 1
+# Speaker metadata headers for raw audio/wav uploads (values may be percent-encoded)
+STREAM_METADATA_HEADERS = {
+    "speakerId": "X-Speaker-Id",
+    "name": "X-Speaker-Name",
+    "gender": "X-Speaker-Gender",
+    "age": "X-Speaker-Age",
+    "country": "X-Speaker-Country",
+    "speakerId_sequence": "X-Speaker-Sequence",
+    "speed": "X-Speed",
+    "text": "X-Text",
+}
 
-        with open(image_path, 'wb') as f:
-            f.write(image_bytes.getvalue())
 
-        # Clean up
-        os.remove(temp_path)
+async def receive_streamed_upload():
+    """
+    Stream a raw audio/wav or multipart upload into an AudioSpool in chunks, without base64.
+    Raw bodies carry the speaker metadata in STREAM_METADATA_HEADERS; multipart bodies
+    use form fields named like the JSON payload plus an 'audio' file part.
+    Returns (data, spool); spool is None when no audio was sent.
+    """
+    spool = AudioSpool()
+
+    if request.mimetype == "multipart/form-data":
+        with stage_timer('body_parse'):
+            form = await request.form
+            files = await request.files
+        data = form.to_dict()
+        audio_file = files.get("audio")
+        if audio_file is None or audio_file.filename == "":
+            return data, None
+        with stage_timer('temp_write'):
+            await spool.extend(iter_file_storage(audio_file))
+    else:
+        data = {
+            field: unquote(request.headers[header])
+            for field, header in STREAM_METADATA_HEADERS.items()
+            if header in request.headers
+        }
+        # The body arrives while it is written, so this includes receiving it
+        with stage_timer('temp_write'):
+            await spool.extend(request.body)
 
-    except Exception as e:
-        print(f"Error processing audio: {e}")
-        return jsonify({'error': 'Audio processing failed'}), 500
+    if spool.size == 0:
+        spool.discard()
+        return data, None
+    return data, spool
 
+
+@app.route('/save_audio/stream', methods=['POST'])
+async def save_audio_stream():
+    """Same as /save_audio, but the recording is sent as a raw audio/wav or multipart body"""
     try:
-        # Build the audio data dictionary without re_record
-        audio_data = {
-            "speakerid": data.get("speakerId"),
-            "name": data.get("name"),
-            "gender": data.get("gender"),
-            "age": data.get("age"),
-            "country": data.get("country"),
-            "speakerId_sequence": speaker_id_sequence,
-            "speed": data.get("speed"),
-            "text": data.get("text"),
-            "validation_status": analysis_results['is_clean'],
-            "update": datetime.now().strftime("%d-%m-%Y-%H:%M:%S"),
-            "image_path": image_path,
-            "analysis_results": {
-                "drops": analysis_results['drops'],
-                "drop_count": len(analysis_results['drops']),
-                "is_clean": analysis_results['is_clean'],
-                "max_sample": analysis_results['max_sample'],
-                "min_sample": analysis_results['min_sample'],
-                "bit_depth": analysis_results['bit_depth'],
-                "sample_rate": analysis_results['sample_rate'],
-                "duration": analysis_results['duration']
-            }
-        }
+        print('save_audio_stream request---> Request')
 
-        # Check if document exists
-        existing_doc = collection.find_one({
-            "speakerId_sequence": speaker_id_sequence,
-            "speakerid": data.get("speakerId"),
-            "name": data.get("name"),
-        })
+        data, spool = await receive_streamed_upload()
+        if spool is None:
+            return jsonify({'error': 'No audio data received'}), 400
 
-        if existing_doc:
-            # Always increment re_record by 1
-            update_query = {
-                "$set": audio_data,
-                "$inc": {"re_record": 1}
-            }
+        return await save_recording(data, spool)
 
-            collection.update_one(
-                {
-                    "speakerId_sequence": speaker_id_sequence,
-                    "speakerid": data.get("speakerId"),
-                    "name": data.get("name"),
-                },
-                update_query
-            )
+    except Exception as e:
+        print(f"Unexpected error in save_audio_stream: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
 
-            print('Data updated successfully')
-            return jsonify({'message': 'Data updated successfully'})
-        else:
-            print('No matching document found to update')
-            return jsonify({'message': 'No matching document found'}), 404
 
+@app.route('/resave_audio/stream', methods=['POST'])
+async def resave_audio_stream():
+    """Same as /resave_audio, but the recording is sent as a raw audio/wav or multipart body"""
+    print('resave_audio_stream request---> Request')
+    try:
+        data, spool = await receive_streamed_upload()
     except Exception as e:
-        print(f'Error updating data: {e}')
-        return jsonify({'error': 'Failed to update data', 'details': str(e)}), 500
-    
+        print(f"Error receiving audio: {e}")
+        return jsonify({'error': 'Audio processing failed'}), 500
+
+    if spool is None:
+        return jsonify({'error': 'No audio data received'}), 400
+
+    return await resave_recording(data, spool)
+
 
 @app.route('/checkfails/<speaker_id>/<country>', methods=['GET'])
 async def check_fails(speaker_id, country):
@@ -566,23 +1076,26 @@ async def check_fails(speaker_id, country):
             "country": country
         }
 
-        failed_docs = list(collection.find(query))
-        # full_Docs means all the documents for the speaker_id like false and true, email based on full_Docs-->Dev-L
-        full_Docs = list(collection.find(queryed))
+        # Failed docs, and whether any doc for the speaker was re-recorded (an indexed find_one, not a full scan)
+        failed_docs, re_recorded = await asyncio.gather(
+            collection.find(query, TRACKDATA_LIST_PROJECTION),
+            collection.find_one({**queryed, "re_record": {"$gte": 1}}, {"_id": 1})
+        )
 
         for doc in failed_docs:
             doc['_id'] = str(doc['_id'])  # Convert ObjectId to string
 
         print(f'Failed docs for speakerid {speaker_id} sent')
 
-        # Check if any document has re_record >= 1
-        if any(doc.get('re_record', 0) >= 1 for doc in full_Docs):
-            email_thread = threading.Thread(
-                target=send_email_with_csv,
-                args=(failed_docs, speaker_id,country)
+        # Email once anything was re-recorded; the email is sent by a job worker. The job id
+        # follows the report's content, so polling again sends nothing new until it changes
+        if re_recorded is not None:
+            await asyncio.to_thread(
+                job_queue.enqueue,
+                report_email_job_id(speaker_id, country, failed_docs),
+                'report_email',
+                {'failed_docs': failed_docs, 'speaker_id': speaker_id, 'country': country}
             )
-            email_thread.daemon = True
-            email_thread.start()
 
         return jsonify(failed_docs), 200
 
@@ -590,6 +1103,13 @@ async def check_fails(speaker_id, country):
         return jsonify({"error": str(e)}), 500
 
 
+def report_email_job_id(speaker_id, country, failed_docs):
+    """Idempotency key of a report email: the failed takes and how often each was re-recorded or updated"""
+    content = sorted((doc['_id'], doc.get('re_record'), doc.get('update')) for doc in failed_docs)
+    digest = hashlib.sha256(json.dumps([len(content), content], default=str).encode()).hexdigest()[:16]
+    return f"email_{speaker_id}_{country}_{digest}"
+
+
 @app.route('/checkdata/<format_id>/<country>', methods=['GET'])
 async def check_data(format_id, country):
     try:
@@ -599,7 +1119,7 @@ async def check_data(format_id, country):
             "speakerid": format_id,
             "country": country
         }
-        data = list(collection.find(query))
+        data = await collection.find(query, TRACKDATA_LIST_PROJECTION)
         for doc in data:
             doc['_id'] = str(doc['_id'])  # Convert ObjectId to string
         return jsonify(data), 200
@@ -609,9 +1129,15 @@ async def check_data(format_id, country):
 
 
 def send_email_with_csv(data, speaker_id,country):
+    import pandas as pd
+
     try:
         # Convert data to DataFrame
-        source_data = list(collection.find({"speakerid": speaker_id}, {"_id": 0}))
+        report_fields = ['name', 'speakerid', 'speakerId_sequence', 'speed', 're_record', 'update', 'validation_status']
+        source_data = list(collection.sync.find(
+            {"speakerid": speaker_id},
+            {"_id": 0, **{field: 1 for field in report_fields}}
+        ))
         df = pd.DataFrame(source_data)
 
         # Drop unwanted columns
@@ -632,18 +1158,15 @@ def send_email_with_csv(data, speaker_id,country):
         ordered_columns = ['NAME', 'SPEAKER_ID','S.NO', 'TYPE','RE-RECORD','UPDATE', 'STATUS']
         df = df[ordered_columns]
 
-        # Prepare file path
-        output_dir = 'tmp_email'
-        os.makedirs(output_dir, exist_ok=True)
+        # Build the CSV attachment once, in memory
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = f"{speaker_id}_Report_{timestamp}.csv"
-        csv_path = os.path.join(output_dir, filename)
+        csv_bytes = df.to_csv(index=False).encode()
+        cc_list = [email.strip() for email in cc_emails.split(",") if email.strip()]
 
-        # Save CSV file
-        df.to_csv(csv_path, index=False)
-    
-        # Loop through recipient emails
-        for recipient_email in EMAIL_RECIPIENT:
+        # One message per recipient; CC addresses get a single copy, on the first one
+        messages = []
+        for index, recipient_email in enumerate(EMAIL_RECIPIENT):
             msg = EmailMessage()
             msg['From'] = 'no-reply@develop-team'
             msg['To'] = recipient_email
@@ -657,37 +1180,190 @@ def send_email_with_csv(data, speaker_id,country):
                 msg['Subject'] = f'SUCCESS: Audio Validation -> Speaker ID {speaker_id}'
                 msg.set_content(f"Hi,Thank You!\n\nWe’re pleased to inform you that the task for Speaker ID {speaker_id} has been successfully completed..\n\nPlease find attached the report for speaker ID: {speaker_id}.\n\n| Total: {len(source_data)} | Failures: {len(data)}\n\n\n\nRegards,\nSoftware Developer")
 
-
             # Attach the CSV file
-            with open(csv_path, 'rb') as f:
-                msg.add_attachment(f.read(), maintype='application', subtype='octet-stream', filename=filename)
-
-            # Send email via SMTP
-            with smtplib.SMTP(EMAIL_SMTP, EMAIL_PORT) as server:
-                server.starttls()
-                server.login(EMAIL_USER, EMAIL_PASSWORD)
-                server.send_message(msg)
+            msg.add_attachment(csv_bytes, maintype='application', subtype='octet-stream', filename=filename)
+            messages.append((msg, [recipient_email] + (cc_list if index == 0 else [])))
 
-            print(f"✅ Email sent to {recipient_email} with CSV attached.")
-
-        # Clean up
-        # os.remove(csv_path)
+        # Send all of them over one authenticated SMTP connection
+        with stage_timer('email_send'):
+            mailer.send(messages)
+        print(f"✅ Email sent to {', '.join(EMAIL_RECIPIENT)} with CSV attached.")
 
     except Exception as e:
         print("❌ Error sending email:", str(e))
+        raise  # Let the job queue retry
+
+
+def send_report_email(job):
+    """Job handler for the report emails queued by /checkfails"""
+    send_email_with_csv(job['failed_docs'], job['speaker_id'], job['country'])
+    return {'recipients': len(EMAIL_RECIPIENT)}
+
+
+def process_medical_submission(job):
+    """
+    Job handler for a queued medical submission: analyze and resample the audio,
+    upload it and its metadata to S3 and record the submission in MongoDB.
+    Safe to run again for the same submission_id: S3 keys are overwritten and
+    the MongoDB document is upserted.
+    """
+    submission_id = job['submission_id']
+    audio_path = job['audio_path']
+    if not os.path.exists(audio_path):
+        # An earlier attempt finished but was not marked done
+        existing = collection.sync.find_one({'submission_id': submission_id}, {'_id': 0, 'metadata': 1})
+        if existing is None:
+            raise PermanentJobError(f"Audio for submission {submission_id} is missing")
+        return medical_submission_summary(existing['metadata'])
+
+    speaker = job['speaker_info']
+    locale = speaker['locale']
+    itn_sequence = job['itn_sequence']
+    target_frequency = job['target_frequency']
+    base_filename = f"audio_{locale}_ITN_{itn_sequence}"
+    original_s3_key = f"original/{base_filename}.wav"
+    modified_s3_key = f"modified/{base_filename}.wav"
+    metadata_s3_key = f"original/metadata_{locale}_ITN_{itn_sequence}.json"
+
+    # Analyze original audio (its image was never stored, so skip rendering)
+    analysis_results, _, timings = analyze_and_render(audio_path, False, base_filename, stream_min_duration=ANALYSIS_STREAM_MIN_SECONDS)
+    for stage, seconds in timings.items():
+        observe_stage(stage, seconds)
+    if analysis_results.get('status') == 'error':
+        raise PermanentJobError(f'Audio analysis failed: {analysis_results["message"]}')
+
+    # Create metadata JSON
+    metadata = {
+        'submission_id': submission_id,
+        'timestamp': job['timestamp'],
+        'speaker_info': speaker,
+        'audio_info': {
+            'sentence_id': job['sentence_id'],
+            'sentence_text': job['sentence_text'],
+            'original_frequency': analysis_results['sample_rate'],
+            'target_frequency': target_frequency,
+            'duration': analysis_results['duration'],
+            'bit_depth': analysis_results['bit_depth'],
+            'itn_sequence': itn_sequence
+        },
+        'analysis_results': analysis_results,
+        'file_paths': {
+            'original_audio': original_s3_key,
+            'modified_audio': modified_s3_key,
+            'metadata': metadata_s3_key
+        }
+    }
+
+    # Convert audio frequency if needed (streamed through soxr, encoded in memory)
+    modified_audio = audio_path
+    if analysis_results['sample_rate'] != target_frequency:
+        with stage_timer('resample'):
+            modified_audio = resample_audio(audio_path, target_frequency, RESAMPLE_QUALITY)
+
+    # Upload to S3 bucket: audio-sourcing-itn (original audio to original/,
+    # modified audio to modified/, metadata to original/), all three concurrently
+    s3_paths, upload_timings = asyncio.run(upload_concurrently({
+        'original_audio': (upload_to_s3, audio_path, original_s3_key, {
+            'speaker-id': speaker['speaker_id'],
+            'locale': locale,
+            'itn-sequence': itn_sequence,
+            'submission-id': submission_id
+        }),
+        'modified_audio': (upload_to_s3, modified_audio, modified_s3_key, {
+            'speaker-id': speaker['speaker_id'],
+            'locale': locale,
+            'itn-sequence': itn_sequence,
+            'submission-id': submission_id,
+            'frequency': str(target_frequency)
+        }),
+        'metadata': (upload_json_to_s3, metadata, metadata_s3_key)
+    }))
+    failed_uploads = [name for name, path in s3_paths.items() if path is None]
+    if failed_uploads:
+        raise RuntimeError(f"S3 upload failed for {', '.join(failed_uploads)}")
+
+    # Update metadata with actual S3 paths
+    metadata['file_paths'] = s3_paths
+
+    # Store in MongoDB for tracking (upserted, so a retried job does not duplicate it)
+    db_record = {
+        'submission_id': submission_id,
+        'speaker_id': speaker['speaker_id'],
+        'speaker_name': speaker['name'],
+        'speaker_gender': speaker['gender'],
+        'speaker_age': speaker['age'],
+        'locale': locale,
+        'sentence_id': job['sentence_id'],
+        'device_type': speaker['device_type'],
+        'target_frequency': target_frequency,
+        'itn_sequence': itn_sequence,
+        'validation_status': analysis_results['is_clean'],
+        'timestamp': datetime.now(),
+        'file_paths': s3_paths,
+        'analysis_results': analysis_results,
+        'metadata': metadata,
+        'upload_timings': upload_timings
+    }
+    with stage_timer('mongo_write'):
+        collection.sync.replace_one({'submission_id': submission_id}, db_record, upsert=True)
+    os.remove(audio_path)
+
+    print(f'Medical audio submission processed successfully: {submission_id}')
+    return medical_submission_summary(metadata)
+
+
+def discard_medical_submission(job):
+    """Failure handler: a submission that failed permanently (PermanentJobError) no longer needs its spooled audio"""
+    if os.path.exists(job['audio_path']):
+        os.remove(job['audio_path'])
+        print(f"Removed spooled audio of failed submission {job['submission_id']}")
+
+
+def medical_submission_summary(metadata):
+    analysis_results = metadata['analysis_results']
+    return {
+        'submission_id': metadata['submission_id'],
+        'validation_status': analysis_results['is_clean'],
+        'file_paths': metadata['file_paths'],
+        'analysis_summary': {
+            'is_clean': analysis_results['is_clean'],
+            'drops_detected': len(analysis_results['drops']),
+            'duration': analysis_results['duration'],
+            'sample_rate': analysis_results['sample_rate']
+        }
+    }
+
+
+# Job kinds run by the job workers (looked up by name in each worker process)
+JOB_HANDLERS = {
+    'medical_submission': process_medical_submission,
+    'report_email': send_report_email
+}
+
+# Clean-up for jobs that raised PermanentJobError. Jobs out of attempts are dead letters
+# instead: their spooled audio stays until POST /jobs/<id>/requeue runs them again.
+JOB_FAILURE_HANDLERS = {
+    'medical_submission': discard_medical_submission
+}
 
 
 @app.route('/api/submit-medical-audio', methods=['POST'])
 async def submit_medical_audio():
     """
-    Handle medical audio submissions with S3 storage and frequency conversion
+    Accept a medical audio submission and queue it for the job workers, which
+    analyze it, convert its frequency, store it in S3 and record it in MongoDB.
+    Answers 202 with the submission_id; GET /jobs/<submission_id> reports progress.
+    A client-supplied submissionId (or Idempotency-Key header) makes retries safe; the
+    submission_id returned for it is scoped to the speaker and locale.
     """
+    spool = AudioSpool()
     try:
         print('Medical audio submission request received')
         
         # Get form data
-        form = await request.form
-        files = await request.files
+        with stage_timer('body_parse'):
+            form = await request.form
+            files = await request.files
         
         # Validate required fields (updated to remove speakerCode and ageGroup, add frequency)
         required_fields = ['speakerId', 'speakerName', 'speakerGender', 'speakerAge', 
@@ -704,167 +1380,76 @@ async def submit_medical_audio():
         if audio_file.filename == '':
             return jsonify({'error': 'No audio file selected'}), 400
         
-        # Generate unique identifier
-        submission_id = str(uuid.uuid4())[:8]
+        # The submission_id is the job's permanent key: derived from the client's idempotency
+        # key scoped to the speaker and locale (so one client's key cannot reach another's
+        # job), or a full random uuid
+        client_key = form.get('submissionId') or request.headers.get('Idempotency-Key')
+        if client_key is None:
+            submission_id = uuid.uuid4().hex
+        elif re.fullmatch(r'[A-Za-z0-9_-]{1,64}', client_key):
+            submission_id = scoped_submission_id(client_key, form['speakerId'], form['locale'])
+        else:
+            return jsonify({'error': 'Invalid submissionId'}), 400
+
+        existing_job = await asyncio.to_thread(job_queue.status, submission_id)
+        if existing_job is not None:
+            return jsonify(medical_submission_accepted(submission_id, existing_job)), 202
+
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         
         # Extract form data
-        speaker_id = form['speakerId']
         locale = form['locale']
         target_frequency = int(form['frequency'])  # Use frequency instead of targetFrequency
-        sentence_id = form['sentenceId']
-        device_type = form['deviceType']
-        
-        # Generate ITN sequence number
-        itn_sequence = get_next_itn_sequence(locale)
-        
-        # Generate filenames using new convention: audio_countrycode_ITN_sequence
-        base_filename = f"audio_{locale}_ITN_{itn_sequence}"
-        original_filename = f"{base_filename}.wav"
-        converted_filename = f"{base_filename}.wav"
-        json_filename = f"metadata_{locale}_ITN_{itn_sequence}.json"
-        
-        # Save temporary audio file
-        temp_filename = f"{base_filename}_{timestamp}.wav"
-        temp_path = os.path.join(tempfile.gettempdir(), temp_filename)
-        
-        # Save uploaded file
-        audio_content = await audio_file.read()
-        with open(temp_path, 'wb') as f:
-            f.write(audio_content)
-        
-        # Analyze original audio
-        analysis_results = analyze_audio(temp_path)
-        if analysis_results.get('status') == 'error':
-            os.remove(temp_path)
-            return jsonify({'error': f'Audio analysis failed: {analysis_results["message"]}'}), 400
-        
-        # Generate analysis image
-        image_bytes = generate_analysis_image(temp_path, analysis_results.get('drops'))
-        
-        # Create metadata JSON
-        metadata = {
-            'submission_id': submission_id,
-            'timestamp': timestamp,
-            'speaker_info': {
-                'speaker_id': speaker_id,
-                'name': form['speakerName'],
-                'gender': form['speakerGender'],
-                'age': int(form['speakerAge']),
-                'locale': locale,
-                'device_type': device_type
-            },
-            'audio_info': {
-                'sentence_id': sentence_id,
-                'sentence_text': form['sentenceText'],
-                'original_frequency': analysis_results['sample_rate'],
-                'target_frequency': target_frequency,
-                'duration': analysis_results['duration'],
-                'bit_depth': analysis_results['bit_depth'],
-                'itn_sequence': itn_sequence
-            },
-            'analysis_results': analysis_results,
-            'file_paths': {
-                'original_audio': f"original/{original_filename}",
-                'modified_audio': f"modified/{converted_filename}",
-                'metadata': f"original/{json_filename}"
-            }
-        }
-        
-        # Convert audio frequency if needed
-        converted_path = temp_path
-        if analysis_results['sample_rate'] != target_frequency:
-            converted_path = os.path.join(tempfile.gettempdir(), f"converted_{temp_filename}")
-            
-            # Load and resample audio
-            audio, sr = sf.read(temp_path)
-            if len(audio.shape) > 1:
-                audio = audio[:, 0]  # Convert to mono
-            
-            # Resample audio
-            audio_resampled = librosa.resample(audio, orig_sr=sr, target_sr=target_frequency)
-            
-            # Save converted audio
-            sf.write(converted_path, audio_resampled, target_frequency)
-        
-        # Upload to S3 bucket: audio-sourcing-itn
-        s3_paths = {}
-        
-        # Upload original audio to S3 original folder
-        original_s3_key = f"original/{original_filename}"
-        s3_paths['original_audio'] = upload_to_s3(temp_path, original_s3_key, {
-            'speaker-id': speaker_id,
-            'locale': locale,
-            'itn-sequence': itn_sequence,
-            'submission-id': submission_id
-        })
-        
-        # Upload modified audio to S3 modified folder
-        modified_s3_key = f"modified/{converted_filename}"
-        s3_paths['modified_audio'] = upload_to_s3(converted_path, modified_s3_key, {
-            'speaker-id': speaker_id,
-            'locale': locale,
-            'itn-sequence': itn_sequence,
-            'submission-id': submission_id,
-            'frequency': str(target_frequency)
-        })
-        
-        # Upload metadata to S3 original folder
-        metadata_s3_key = f"original/{json_filename}"
-        s3_paths['metadata'] = upload_json_to_s3(metadata, metadata_s3_key)
-        
-        # Update metadata with actual S3 paths
-        metadata['file_paths'] = {
-            'original_audio': s3_paths['original_audio'],
-            'modified_audio': s3_paths['modified_audio'],
-            'metadata': s3_paths['metadata']
-        }
-        
-        # Store in MongoDB for tracking
-        db_record = {
-            'submission_id': submission_id,
-            'speaker_id': speaker_id,
-            'speaker_name': form['speakerName'],
-            'speaker_gender': form['speakerGender'],
-            'speaker_age': int(form['speakerAge']),
+        speaker_info = {
+            'speaker_id': form['speakerId'],
+            'name': form['speakerName'],
+            'gender': form['speakerGender'],
+            'age': int(form['speakerAge']),
             'locale': locale,
-            'sentence_id': sentence_id,
-            'device_type': device_type,
-            'target_frequency': target_frequency,
-            'itn_sequence': itn_sequence,
-            'validation_status': analysis_results['is_clean'],
-            'timestamp': datetime.now(),
-            'file_paths': metadata['file_paths'],
-            'analysis_results': analysis_results,
-            'metadata': metadata
+            'device_type': form['deviceType']
         }
         
-        # Insert into MongoDB
+        # Read uploaded file (kept in memory unless it is very large)
+        with stage_timer('temp_write'):
+            await spool.extend(iter_file_storage(audio_file))
+
+        # Reject undecodable audio now; reading the header is cheap, full analysis runs in the job
         try:
-            result = collection.insert_one(db_record)
-            print(f'Medical audio submission stored in MongoDB: {result.inserted_id}')
+            await asyncio.to_thread(sf.info, open_audio_source(spool.source))
         except Exception as e:
-            print(f'MongoDB insertion failed: {e}')
-        
-        # Clean up temporary files
-        os.remove(temp_path)
-        if converted_path != temp_path:
-            os.remove(converted_path)
+            return jsonify({'error': f'Audio analysis failed: {e}'}), 400
         
-        print(f'Medical audio submission processed successfully: {submission_id}')
-        
-        return jsonify({
-            'message': 'Audio submitted successfully',
+        # Generate ITN sequence number
+        itn_sequence = await asyncio.to_thread(get_next_itn_sequence, locale)
+
+        # Keep the audio on disk until its job has uploaded it
+        audio_path = os.path.join(JOB_SPOOL_FOLDER, f"{submission_id}_{uuid.uuid4().hex}.wav")
+        with stage_timer('job_spool_write'):
+            if spool.path:
+                await asyncio.to_thread(shutil.move, spool.path, audio_path)
+                spool.path = None
+            else:
+                async with aiofiles.open(audio_path, 'wb') as f:
+                    await f.write(spool.source)
+
+        job = {
             'submission_id': submission_id,
-            'validation_status': analysis_results['is_clean'],
-            'file_paths': metadata['file_paths'],
-            'analysis_summary': {
-                'is_clean': analysis_results['is_clean'],
-                'drops_detected': len(analysis_results['drops']),
-                'duration': analysis_results['duration'],
-                'sample_rate': analysis_results['sample_rate']
-            }
-        })
+            'timestamp': timestamp,
+            'audio_path': audio_path,
+            'speaker_info': speaker_info,
+            'sentence_id': form['sentenceId'],
+            'sentence_text': form['sentenceText'],
+            'target_frequency': target_frequency,
+            'itn_sequence': itn_sequence
+        }
+        queued = await asyncio.to_thread(job_queue.enqueue, submission_id, 'medical_submission', job)
+        if not queued:
+            # A concurrent request with the same key won the race
+            os.remove(audio_path)
+        
+        print(f'Medical audio submission queued: {submission_id}')
+        job_state = await asyncio.to_thread(job_queue.status, submission_id)
+        return jsonify(medical_submission_accepted(submission_id, job_state)), 202
         
     except Exception as e:
         print(f"Error in medical audio submission: {e}")
@@ -872,6 +1457,27 @@ async def submit_medical_audio():
         traceback.print_exc()
         return jsonify({'error': 'Internal server error', 'details': str(e)}), 500
 
+    finally:
+        # Clean up the spooled upload, including on early returns
+        spool.discard()
+
+
+def scoped_submission_id(client_key, speaker_id, locale):
+    """The same client key always maps to the same job, but only for the same speaker and locale"""
+    return hashlib.sha256(f"{speaker_id}\0{locale}\0{client_key}".encode()).hexdigest()[:32]
+
+
+def medical_submission_accepted(submission_id, job_state):
+    response = {
+        'message': 'Audio submitted successfully',
+        'submission_id': submission_id,
+        'status': job_state['status'],
+        'status_url': f"/jobs/{submission_id}"
+    }
+    if job_state['result'] is not None:
+        response.update(job_state['result'])
+    return response
+
 
 @app.route('/medical-asr')
 async def medical_asr_interface():
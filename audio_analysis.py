@@ -0,0 +1,645 @@
+from functools import cached_property
+import itertools
+from io import BytesIO
+import os
+import re
+import time
+import soundfile as sf
+import numpy as np
+import librosa
+
+# Analysis parameters
+FRAME_LENGTH = 1024
+HOP_LENGTH = 512
+CUTOFF_FREQ = 20000  # 20 kHz
+THRESHOLD = 0.02
+
+# STFTs run in float32 (complex64), half the memory and FFT work of float64; int16
+# samples convert exactly. bench_analysis.py --check-float64 compares decisions with float64.
+ANALYSIS_DTYPE = np.float32
+
+# magma (specshow's colormap for dB spectrograms) sampled at 17 points, expanded to a 256-entry LUT
+_MAGMA_ANCHORS = np.array([
+    (0, 0, 4), (10, 8, 34), (29, 17, 71), (54, 16, 107), (81, 18, 124), (106, 28, 129),
+    (131, 38, 129), (156, 46, 127), (183, 55, 121), (208, 65, 111), (231, 82, 99),
+    (245, 107, 92), (252, 137, 97), (254, 167, 114), (254, 196, 136), (253, 226, 163),
+    (252, 253, 191)
+], dtype=float)
+SPECTROGRAM_LUT = np.stack([
+    np.interp(np.linspace(0, 1, 256), np.linspace(0, 1, len(_MAGMA_ANCHORS)), _MAGMA_ANCHORS[:, c])
+    for c in range(3)
+], axis=1).round().astype(np.uint8)
+
+
+class AudioAnalysis:
+    """
+    Decode a recording once and share its STFT between drop detection and image rendering.
+    The source can be a file path, raw WAV bytes or a file-like object, so uploads can be
+    analyzed without a temp file. Everything is computed lazily on first access, so errors
+    surface inside analyze_audio / generate_analysis_image exactly as before.
+    """
+
+    def __init__(self, source, frame_length=FRAME_LENGTH, hop_length=HOP_LENGTH,
+                 cutoff_freq=CUTOFF_FREQ, threshold=THRESHOLD, name=None, dtype=ANALYSIS_DTYPE):
+        self.source = source
+        self._name = name
+        self.frame_length = frame_length
+        self.hop_length = hop_length
+        self.cutoff_freq = cutoff_freq
+        self.threshold = threshold
+        self.dtype = dtype
+
+    @cached_property
+    def _decoded(self):
+        # Read audio as int16 to preserve original values, format info from the same handle
+        with sf.SoundFile(open_audio_source(self.source)) as f:
+            subtype_info = f.subtype_info
+            sr = f.samplerate
+            audio = f.read(dtype='int16')
+        if len(audio.shape) > 1:
+            audio = audio[:, 0]
+
+        bit_depth_match = re.search(r'(\d+)', subtype_info)
+        bit_depth = int(bit_depth_match.group(1)) if bit_depth_match else 16
+        return audio, sr, bit_depth
+
+    @property
+    def audio(self):
+        return self._decoded[0]
+
+    @property
+    def sr(self):
+        return self._decoded[1]
+
+    @property
+    def bit_depth(self):
+        return self._decoded[2]
+
+    @property
+    def duration(self):
+        return len(self.audio) / self.sr
+
+    @property
+    def name(self):
+        if self._name:
+            return self._name
+        if isinstance(self.source, (str, os.PathLike)):
+            return os.path.basename(str(self.source)).replace('.wav', '')
+        return 'audio'
+
+    @cached_property
+    def magnitude(self):
+        """Magnitude STFT, computed once and shared by the energy engine and the image"""
+        return np.abs(librosa.stft(self.audio.astype(self.dtype), n_fft=self.frame_length, hop_length=self.hop_length))
+
+    @cached_property
+    def D(self):
+        """Full dB spectrogram, referenced to its maximum (only needed for the image)"""
+        return librosa.amplitude_to_db(self.magnitude, ref=np.max)
+
+    @cached_property
+    def frequencies(self):
+        return librosa.fft_frequencies(sr=self.sr, n_fft=self.frame_length)
+
+    @cached_property
+    def high_freq_energy(self):
+        return high_band_energy(self.magnitude, self.frequencies, self.cutoff_freq)
+
+    @cached_property
+    def time_axis(self):
+        return np.linspace(0, self.duration, len(self.high_freq_energy))
+
+
+def high_band_energy(magnitude, frequencies, cutoff_freq, top_db=80.0, ref=None):
+    """
+    Per-frame energy of the bins at or above cutoff_freq, normalized the same way as
+    summing db_to_amplitude(amplitude_to_db(S, ref=np.max)) over that band.
+
+    The dB conversion is elementwise, so only the band is converted. The reference is
+    still the full-spectrum maximum, and the top_db floor is always -top_db because
+    the reference bin itself sits at exactly 0 dB. Pass ref to convert a block of
+    frames against the maximum of the whole recording.
+    """
+    if ref is None:
+        ref = np.max(magnitude)
+    D_high_freq = librosa.amplitude_to_db(magnitude[frequencies >= cutoff_freq, :], ref=ref, top_db=None)
+    np.maximum(D_high_freq, -top_db, out=D_high_freq)
+    return np.sum(librosa.db_to_amplitude(D_high_freq), axis=0)
+
+
+def open_audio_source(source):
+    """soundfile reads paths and file objects; wrap raw bytes in a buffer"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return BytesIO(source)
+    return source
+
+
+def _as_analysis(source):
+    return source if isinstance(source, AudioAnalysis) else AudioAnalysis(source)
+
+
+def detect_drops(energy, threshold):
+    """Detect only frame drops (single or double frames above threshold)"""
+    energy = np.asarray(energy)
+    above = np.concatenate(([False], energy > threshold, [False]))
+
+    # Run boundaries: rises are run starts, falls are one past each run's last frame
+    edges = np.flatnonzero(above[1:] != above[:-1])
+    starts, stops = edges[0::2], edges[1::2]
+
+    # Only detect single/double frame drops
+    keep = (stops - starts) <= 2
+    starts, stops = starts[keep], stops[keep]
+    peaks = np.maximum(energy[starts], energy[stops - 1])
+    ends = np.minimum(stops, len(energy) - 1)
+
+    drops = [('drop', int(start), int(end)) for start, end in zip(starts, ends)]
+    drop_energy_info = [f"{peak:.2f}" for peak in peaks]
+    return drops, drop_energy_info
+
+
+class DropDetector:
+    """
+    Incremental detect_drops: feed() per-frame energies block by block, then
+    finish() returns the same (drops, drop_energy_info) as detect_drops would
+    for the concatenated energies. Only the currently open run is kept.
+    """
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.frames = 0
+        self.drops = []
+        self.drop_energy_info = []
+        self._run_start = None
+        self._run_first = None
+        self._last = None
+
+    def feed(self, energy):
+        energy = np.asarray(energy)
+        if len(energy) == 0:
+            return
+        above = energy > self.threshold
+        previous = np.concatenate(([self._run_start is not None], above[:-1]))
+        for i in np.flatnonzero(above != previous):
+            if above[i]:
+                self._run_start, self._run_first = self.frames + i, energy[i]
+            else:
+                stop = self.frames + i
+                self._end_run(stop, stop, energy[i - 1] if i > 0 else self._last)
+        self.frames += len(energy)
+        self._last = energy[-1]
+
+    def finish(self):
+        if self._run_start is not None:
+            # A run reaching the last frame ends on it
+            self._end_run(self.frames, self.frames - 1, self._last)
+        return self.drops, self.drop_energy_info
+
+    def _end_run(self, stop, end, last):
+        start = self._run_start
+        self._run_start = None
+        # Only detect single/double frame drops
+        if stop - start <= 2:
+            self.drops.append(('drop', int(start), int(end)))
+            self.drop_energy_info.append(f"{max(self._run_first, last):.2f}")
+
+
+def analyze_audio(source):
+    """Analyze a file path or an already-built AudioAnalysis for frame drops"""
+    try:
+        analysis = _as_analysis(source)
+
+        # Skip if STFT is empty
+        if analysis.magnitude.shape[1] == 0:
+            return {
+                'status': 'error',
+                'message': 'STFT result is empty'
+            }
+
+        # Detect only drops (skip noise detection)
+        high_freq_energy = analysis.high_freq_energy
+        drops, drop_energy_info = detect_drops(high_freq_energy, analysis.threshold)
+
+        audio = analysis.audio
+        return build_results(
+            int(np.max(audio)), int(np.min(audio)), analysis.bit_depth, analysis.sr,
+            analysis.duration, drops, drop_energy_info, analysis.time_axis
+        )
+
+    except Exception as e:
+        return {
+            'status': 'error',
+            'message': str(e)
+        }
+
+
+def build_results(max_sample, min_sample, bit_depth, sr, duration, drops, drop_energy_info, time_axis):
+    """analyze_audio's results dict; time_axis maps frame indices to seconds"""
+    # Prepare results
+    results = {
+        'max_sample': max_sample,
+        'min_sample': min_sample,
+        'bit_depth': bit_depth,
+        'sample_rate': sr,
+        'duration': duration,
+        'drops': [],
+        'is_clean': len(drops) == 0  # False if any drops detected
+    }
+
+    # Process drops
+    for (drop_type, start, end), max_energy in zip(drops, drop_energy_info):
+        start_time = time_axis[start] if start < len(time_axis) else time_axis[-1]
+        end_time = time_axis[end] if end < len(time_axis) else time_axis[-1]
+
+        results['drops'].append({
+            'type': drop_type,
+            'start': float(start_time),
+            'end': float(end_time),
+            'max_energy': max_energy
+        })
+
+    return results
+
+
+# Samples per block in streaming analysis (~5 s at 48 kHz)
+STREAM_BLOCK_FRAMES = 256 * 1024
+
+
+class FrameTimes:
+    """np.linspace(0, duration, n_frames) indexed lazily, so long recordings need no array"""
+
+    def __init__(self, duration, n_frames):
+        self.duration = duration
+        self.n_frames = n_frames
+
+    def __len__(self):
+        return self.n_frames
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.n_frames
+        if self.n_frames == 1:
+            return 0.0
+        if index == self.n_frames - 1:
+            return self.duration
+        # Same arithmetic as np.linspace
+        return float(index) * (self.duration / (self.n_frames - 1)) + 0.0
+
+
+def first_channel_blocks(f, blocksize=STREAM_BLOCK_FRAMES):
+    """int16 samples of an open SoundFile's first channel, block by block from its start"""
+    f.seek(0)
+    for block in f.blocks(blocksize=blocksize, dtype='int16', always_2d=True):
+        yield block[:, 0]
+
+
+def stft_magnitude_blocks(blocks, frame_length=FRAME_LENGTH, hop_length=HOP_LENGTH, dtype=ANALYSIS_DTYPE):
+    """
+    Magnitude STFT of a signal given as consecutive sample blocks, yielded a block of
+    frames at a time. Frames are identical to librosa.stft(center=True) of the whole
+    signal: frame_length // 2 zeros of padding at each end, and each block carries the
+    samples its last frames share with the next block.
+    """
+    pad = np.zeros(frame_length // 2, dtype=dtype)
+    carry = pad
+    for samples in itertools.chain(blocks, [pad]):
+        buffer = np.concatenate((carry, samples.astype(dtype)))
+        if len(buffer) < frame_length:
+            carry = buffer
+            continue
+        n_frames = 1 + (len(buffer) - frame_length) // hop_length
+        yield np.abs(librosa.stft(buffer[:(n_frames - 1) * hop_length + frame_length],
+                                  n_fft=frame_length, hop_length=hop_length, center=False))
+        carry = buffer[n_frames * hop_length:]
+
+
+def analyze_audio_stream(source, frame_length=FRAME_LENGTH, hop_length=HOP_LENGTH,
+                         cutoff_freq=CUTOFF_FREQ, threshold=THRESHOLD, blocksize=STREAM_BLOCK_FRAMES,
+                         dtype=ANALYSIS_DTYPE):
+    """
+    analyze_audio for long recordings, reading the file block by block so memory does not
+    grow with its length. Results are identical to analyze_audio. The energy is normalized
+    to the loudest bin of the whole recording, so this takes two passes: the first finds
+    that maximum, the second computes the high-band energy and detects drops as it goes.
+    """
+    try:
+        with sf.SoundFile(open_audio_source(source)) as f:
+            bit_depth_match = re.search(r'(\d+)', f.subtype_info)
+            bit_depth = int(bit_depth_match.group(1)) if bit_depth_match else 16
+            sr = f.samplerate
+            frequencies = librosa.fft_frequencies(sr=sr, n_fft=frame_length)
+
+            # Pass 1: sample range, length and the spectrum maximum
+            n_samples, max_sample, min_sample = 0, -np.inf, np.inf
+            ref = 0.0
+            n_stft_frames = 0
+
+            def tracked(blocks):
+                nonlocal n_samples, max_sample, min_sample
+                for block in blocks:
+                    if len(block):
+                        n_samples += len(block)
+                        max_sample = max(max_sample, int(block.max()))
+                        min_sample = min(min_sample, int(block.min()))
+                    yield block
+
+            for magnitude in stft_magnitude_blocks(tracked(first_channel_blocks(f, blocksize)),
+                                                   frame_length, hop_length, dtype):
+                ref = max(ref, np.max(magnitude))
+                n_stft_frames += magnitude.shape[1]
+            if n_samples == 0:
+                return analyze_audio(AudioAnalysis(source, dtype=dtype))  # Let the in-memory path report the error
+
+            # Pass 2: high-band energy per frame, drops detected block by block
+            detector = DropDetector(threshold)
+            for magnitude in stft_magnitude_blocks(first_channel_blocks(f, blocksize), frame_length, hop_length, dtype):
+                detector.feed(high_band_energy(magnitude, frequencies, cutoff_freq, ref=ref))
+            drops, drop_energy_info = detector.finish()
+
+        duration = n_samples / sr
+        return build_results(
+            max_sample, min_sample, bit_depth, sr, duration,
+            drops, drop_energy_info, FrameTimes(duration, n_stft_frames)
+        )
+
+    except Exception as e:
+        return {
+            'status': 'error',
+            'message': str(e)
+        }
+
+
+def _pyplot():
+    """matplotlib is only imported when the first high-quality image is rendered"""
+    import matplotlib
+    matplotlib.use('Agg')  # Set the backend to Agg before importing pyplot
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def generate_analysis_image(source, drops=None, quality='high'):
+    """
+    Render the energy/spectrogram figure for a file path or an AudioAnalysis.
+    quality='high' uses matplotlib; quality='fast' uses render_fast_image.
+    """
+    try:
+        analysis = _as_analysis(source)
+        if quality == 'fast':
+            return render_fast_image(analysis, drops)
+
+        D = analysis.D
+        sr = analysis.sr
+        hop_length = analysis.hop_length
+        threshold = analysis.threshold
+        high_freq_energy = analysis.high_freq_energy
+
+        plt = _pyplot()
+        import librosa.display
+
+        # Create figure with larger size
+        fig, ax = plt.subplots(2, 1, figsize=(14, 8), sharex=True)
+
+        # Spectrogram (bottom subplot)
+        img = librosa.display.specshow(D, sr=sr, hop_length=hop_length,
+                                     x_axis='time', y_axis='linear', ax=ax[1])
+        fig.colorbar(img, ax=ax[1], format="%+2.0f dB", label='Amplitude (dB)')
+        ax[1].set_ylabel('Frequency (Hz)', fontsize=12)
+        ax[1].set_xlabel('Time (s)', fontsize=12)
+
+        # High frequency energy plot (top subplot)
+        time_axis = analysis.time_axis
+
+        # Plot energy and threshold
+        ax[0].plot(time_axis, high_freq_energy, color='red', linewidth=2,
+                  alpha=0.8, label='High-Freq Energy (20k+ Hz)')
+        ax[0].axhline(threshold, color='blue', linestyle='--',
+                     linewidth=1.5, alpha=0.7, label=f'Threshold ({threshold:.2f})')
+
+        # Mark drop regions if provided
+        if drops:
+            for drop in drops:
+                start_time = drop['start']
+                end_time = drop['end']
+                ax[0].axvspan(start_time, end_time, color='blue', alpha=0.3, label='Frame Drop')
+
+        # Customize the energy plot
+        ax[0].set_ylabel('Energy', color='red', fontsize=12)
+        ax[0].tick_params(axis='y', labelcolor='red')
+        ax[0].grid(True, alpha=0.3)
+
+        # Add title with filename
+        fig.suptitle(f"Audio Analysis: {analysis.name}", fontsize=14, y=1.02)
+
+        # Create a unified legend
+        handles, labels = [], []
+        for a in [ax[0], ax[1]]:
+            h, l = a.get_legend_handles_labels()
+            handles.extend(h)
+            labels.extend(l)
+
+        # Remove duplicate labels
+        unique = [(h, l) for i, (h, l) in enumerate(zip(handles, labels))
+                  if l not in labels[:i]]
+        fig.legend(*zip(*unique), loc='upper right', bbox_to_anchor=(1.0, 1.0),
+                  fontsize=10, framealpha=1)
+
+        # Save to bytes
+        img_bytes = BytesIO()
+        plt.tight_layout()
+        plt.savefig(img_bytes, format='png', bbox_inches='tight', dpi=120)
+        plt.close(fig)
+        img_bytes.seek(0)
+
+        return img_bytes
+
+    except Exception as e:
+        print(f"Error generating analysis image: {e}")
+        return None
+
+
+def _nice_step(span, target_ticks):
+    """Round span / target_ticks up to 1, 2 or 5 times a power of ten"""
+    raw = span / max(target_ticks, 1)
+    if raw <= 0:
+        return 1.0
+    magnitude = 10 ** np.floor(np.log10(raw))
+    for factor in (1, 2, 5, 10):
+        if raw <= factor * magnitude:
+            return factor * magnitude
+    return 10 * magnitude
+
+
+def render_fast_image(analysis, drops=None, width=1680, height=960):
+    """
+    Draw the same two panels as the matplotlib figure straight into an RGB array and
+    encode it with Pillow. The spectrogram is sampled down to the plot size before the
+    dB conversion and coloured through SPECTROGRAM_LUT; the energy curve is drawn as a
+    per-column min/max envelope so one-frame drops survive the downsampling.
+    """
+    from PIL import Image, ImageDraw, ImageFont
+
+    red, blue, black, grid = (220, 30, 30), (40, 60, 220), (0, 0, 0), (225, 225, 225)
+    font = ImageFont.load_default(size=14)
+    title_font = ImageFont.load_default(size=18)
+
+    left, right, top, bottom, gap = 90, 110, 60, 50, 40
+    plot_w = width - left - right
+    energy_top, energy_h = top, 250
+    spec_top = energy_top + energy_h + gap
+    spec_h = height - spec_top - bottom
+
+    canvas = np.full((height, width, 3), 255, dtype=np.uint8)
+    magnitude = analysis.magnitude
+    n_bins, n_frames = magnitude.shape
+    duration = analysis.duration
+
+    # Spectrogram: sample the plot grid first, then convert only those cells to dB
+    rows = np.linspace(n_bins - 1, 0, spec_h).round().astype(int)
+    cols = np.arange(plot_w) * n_frames // plot_w
+    D_plot = librosa.amplitude_to_db(magnitude[np.ix_(rows, cols)], ref=np.max(magnitude), top_db=None)
+    np.maximum(D_plot, -80.0, out=D_plot)
+    lo, hi = D_plot.min(), D_plot.max()
+    levels = ((D_plot - lo) * (255.0 / ((hi - lo) or 1.0))).astype(np.uint8)
+    canvas[spec_top:spec_top + spec_h, left:left + plot_w] = SPECTROGRAM_LUT[levels]
+
+    # Colorbar
+    bar_left = left + plot_w + 15
+    bar_levels = np.linspace(255, 0, spec_h).astype(np.uint8)
+    canvas[spec_top:spec_top + spec_h, bar_left:bar_left + 15] = SPECTROGRAM_LUT[bar_levels][:, None, :]
+
+    # Energy panel: per-column envelope of the high-frequency energy
+    energy = analysis.high_freq_energy
+    threshold = analysis.threshold
+    y_max = max(float(np.max(energy)) if len(energy) else 0.0, threshold) * 1.1 or 1.0
+    starts = np.minimum(np.arange(plot_w) * len(energy) // plot_w, max(len(energy) - 1, 0))
+
+    def energy_y(values):
+        return (energy_top + energy_h - 1 - np.clip(values / y_max, 0, 1) * (energy_h - 1)).round().astype(int)
+
+    def time_x(seconds):
+        return int(round(left + (seconds / duration if duration else 0) * (plot_w - 1)))
+
+    for value in np.arange(0, y_max, _nice_step(y_max, 4))[1:]:
+        canvas[energy_y(value), left:left + plot_w] = grid
+
+    # Mark drop regions if provided
+    for drop in drops or []:
+        x0, x1 = time_x(drop['start']), time_x(drop['end'])
+        region = canvas[energy_top:energy_top + energy_h, x0:max(x1, x0 + 1) + 1]
+        region[:] = (region * 0.7 + np.array(blue) * 0.3).astype(np.uint8)
+
+    # Dashed threshold line
+    dash = (np.arange(plot_w) // 8) % 2 == 0
+    canvas[energy_y(threshold), left:left + plot_w][dash] = blue
+
+    image = Image.fromarray(canvas)
+    draw = ImageDraw.Draw(image)
+
+    if len(energy):
+        peaks = energy_y(np.maximum.reduceat(energy, starts))
+        troughs = energy_y(np.minimum.reduceat(energy, starts))
+        points = []
+        for x, y_top, y_bottom in zip(range(left, left + plot_w), peaks, troughs):
+            points.extend(((x, int(y_top)), (x, int(y_bottom))))
+        draw.line(points, fill=red, width=2)
+
+    # Frames, ticks and labels
+    draw.rectangle((left - 1, energy_top - 1, left + plot_w, energy_top + energy_h), outline=black)
+    draw.rectangle((left - 1, spec_top - 1, left + plot_w, spec_top + spec_h), outline=black)
+    draw.rectangle((bar_left - 1, spec_top - 1, bar_left + 15, spec_top + spec_h), outline=black)
+
+    for seconds in np.arange(0, duration + 1e-9, _nice_step(duration, 10)):
+        x = time_x(seconds)
+        draw.line((x, spec_top + spec_h, x, spec_top + spec_h + 5), fill=black)
+        draw.text((x, spec_top + spec_h + 8), f"{seconds:g}", fill=black, font=font, anchor='mt')
+    draw.text((left + plot_w // 2, height - 8), "Time (s)", fill=black, font=font, anchor='mb')
+
+    nyquist = analysis.sr / 2
+    for hz in np.arange(0, nyquist + 1e-9, _nice_step(nyquist, 6)):
+        y = int(round(spec_top + spec_h - 1 - hz / nyquist * (spec_h - 1)))
+        draw.line((left - 6, y, left - 1, y), fill=black)
+        draw.text((left - 8, y), f"{hz:g}", fill=black, font=font, anchor='rm')
+    draw.text((8, spec_top + spec_h // 2), "Hz", fill=black, font=font, anchor='lm')
+
+    for value in np.arange(0, y_max, _nice_step(y_max, 4)):
+        y = int(energy_y(value))
+        draw.text((left - 8, y), f"{value:g}", fill=red, font=font, anchor='rm')
+    draw.text((8, energy_top + energy_h // 2), "Energy", fill=red, font=font, anchor='lm')
+
+    draw.text((bar_left + 20, spec_top), f"{hi:+.0f} dB", fill=black, font=font, anchor='lt')
+    draw.text((bar_left + 20, spec_top + spec_h), f"{lo:+.0f} dB", fill=black, font=font, anchor='lb')
+
+    draw.text((width // 2, 12), f"Audio Analysis: {analysis.name}", fill=black, font=title_font, anchor='mt')
+
+    # Legend
+    legend = [("High-Freq Energy (20k+ Hz)", red), (f"Threshold ({threshold:.2f})", blue)]
+    if drops:
+        legend.append(("Frame Drop", None))
+    for i, (label, color) in enumerate(legend):
+        y = energy_top + 12 + i * 20
+        if color is None:
+            draw.rectangle((left + plot_w - 230, y - 5, left + plot_w - 205, y + 5), fill=(180, 188, 244))
+        else:
+            draw.line((left + plot_w - 230, y, left + plot_w - 205, y), fill=color, width=3)
+        draw.text((left + plot_w - 198, y), label, fill=black, font=font, anchor='lm')
+
+    # Save to bytes
+    img_bytes = BytesIO()
+    image.save(img_bytes, format='PNG', compress_level=3)
+    img_bytes.seek(0)
+    return img_bytes
+
+
+def _duration(source):
+    try:
+        return sf.info(open_audio_source(source)).duration
+    except Exception:
+        return 0.0  # Undecodable; the in-memory path reports the error
+
+
+def image_required(render, analysis_results):
+    """
+    Whether a render mode asks for an image for these results: True always,
+    False never, 'failed' only for takes with drops
+    """
+    if analysis_results.get('status') == 'error':
+        return False
+    if render == 'failed':
+        return not analysis_results.get('is_clean', True)
+    return bool(render)
+
+
+def analyze_and_render(source, render=True, name=None, quality='high', stream_min_duration=None):
+    """
+    Process-pool entry point: analyze a recording (path or WAV bytes) and render its
+    image from the same STFT when image_required(render, results) says so.
+    Recordings of at least stream_min_duration seconds are analyzed with
+    analyze_audio_stream; only their image, if one is needed, loads the whole file.
+    Returns (analysis_results, image_bytes, {stage: seconds taken}); image_bytes is
+    None when not rendered, and only the stages that ran ('analyze', 'image') are timed.
+    """
+    analysis = AudioAnalysis(source, name=name)
+    timings = {}
+    start = time.perf_counter()
+    if stream_min_duration is not None and _duration(source) >= stream_min_duration:
+        analysis_results = analyze_audio_stream(source)
+    else:
+        analysis_results = analyze_audio(analysis)
+    timings['analyze'] = time.perf_counter() - start
+    image_bytes = None
+    if image_required(render, analysis_results):
+        start = time.perf_counter()
+        image_bytes = generate_analysis_image(analysis, analysis_results.get('drops'), quality)
+        timings['image'] = time.perf_counter() - start
+    return analysis_results, image_bytes, timings
+
+
+def warm_up(quality='high'):
+    """
+    Load everything analysis and rendering need (librosa's STFT stack, matplotlib or
+    Pillow) by running a short synthetic take through analyze_and_render.
+    """
+    t = np.arange(HOP_LENGTH * 16) / 48000
+    take = BytesIO()
+    sf.write(take, (0.1 * np.sin(2 * np.pi * 440 * t)).astype(np.float32), 48000, format='WAV', subtype='PCM_16')
+    analyze_and_render(take.getvalue(), True, 'warm-up', quality)
@@ -0,0 +1,262 @@
+"""
+Offline re-analysis of a corpus of recordings, e.g. after changing the threshold
+or cutoff frequency.
+
+    python batch_analyze.py medical_audio_storage/audio --out results.jsonl
+    python batch_analyze.py s3://audio-sourcing-itn/original/ --out results --format parquet --threshold 0.03
+
+Sources are local directories (searched recursively for --pattern) or S3 prefixes.
+Files are analyzed with analyze_audio (analyze_audio_stream for long recordings)
+across a process pool and results are written as they arrive: one JSON line per
+file, or Parquet part files in the --out directory. Successfully analyzed sources
+are listed in <out>.checkpoint; run the same command again to resume where it
+stopped and retry the sources that failed (their error rows stay in the output).
+"""
+import argparse
+import fnmatch
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+from urllib.parse import urlparse
+import soundfile as sf
+from audio_analysis import (AudioAnalysis, CUTOFF_FREQ, FRAME_LENGTH, HOP_LENGTH, THRESHOLD,
+                            analyze_audio, analyze_audio_stream, open_audio_source)
+
+_s3_client = None
+_s3_client_pid = None
+
+
+def s3_client():
+    """
+    One S3 client per process (S3_ENDPOINT_URL points at a local stand-in). Keyed
+    by pid, because list_sources builds one in the parent before the pool forks and
+    boto3 clients must not be shared across a fork.
+    """
+    global _s3_client, _s3_client_pid
+    if _s3_client is None or _s3_client_pid != os.getpid():
+        import boto3
+        _s3_client = boto3.client('s3', endpoint_url=os.getenv('S3_ENDPOINT_URL') or None)
+        _s3_client_pid = os.getpid()
+    return _s3_client
+
+
+def list_sources(locations, pattern):
+    """Expand directories, files and s3://bucket/prefix locations into sorted source ids"""
+    sources = []
+    for location in locations:
+        if location.startswith('s3://'):
+            url = urlparse(location)
+            paginator = s3_client().get_paginator('list_objects_v2')
+            for page in paginator.paginate(Bucket=url.netloc, Prefix=url.path.lstrip('/')):
+                for obj in page.get('Contents', []):
+                    if fnmatch.fnmatch(os.path.basename(obj['Key']), pattern):
+                        sources.append(f"s3://{url.netloc}/{obj['Key']}")
+        elif os.path.isdir(location):
+            sources.extend(glob.glob(os.path.join(location, '**', pattern), recursive=True))
+        else:
+            sources.append(location)
+    return sorted(set(sources))
+
+
+def load_source(source):
+    """A local path as is, or the bytes of an S3 object"""
+    if source.startswith('s3://'):
+        url = urlparse(source)
+        return s3_client().get_object(Bucket=url.netloc, Key=url.path.lstrip('/'))['Body'].read()
+    return source
+
+
+def analyze_source(task):
+    """Pool worker: analyze one source and return its output record"""
+    source, params = task
+    start = time.perf_counter()
+    try:
+        audio = load_source(source)
+        if sf.info(open_audio_source(audio)).duration >= params['stream_min_seconds']:
+            results = analyze_audio_stream(
+                audio, params['frame_length'], params['hop_length'], params['cutoff_freq'], params['threshold']
+            )
+        else:
+            results = analyze_audio(AudioAnalysis(
+                audio, params['frame_length'], params['hop_length'], params['cutoff_freq'], params['threshold']
+            ))
+    except Exception as e:
+        results = {'status': 'error', 'message': str(e)}
+
+    record = {'source': source, 'status': results.pop('status', 'ok'), 'message': results.pop('message', None)}
+    record.update(results)
+    record['drop_count'] = len(results.get('drops', []))
+    record['analysis_seconds'] = time.perf_counter() - start
+    return record
+
+
+class Checkpoint:
+    """
+    Append-only list of completed sources. The first line records the analysis
+    parameters, so a resume with different parameters is refused.
+    """
+
+    def __init__(self, path, params):
+        self.path = path
+        self.done = set()
+        if os.path.exists(path):
+            with open(path) as f:
+                saved = json.loads(f.readline() or 'null')
+                if saved != params:
+                    raise SystemExit(f"{path} was written with different parameters {saved}; use a new --out")
+                self.done.update(line.rstrip('\n') for line in f if line.strip())
+        else:
+            with open(path, 'w') as f:
+                f.write(json.dumps(params) + '\n')
+        self._file = open(path, 'a')
+
+    def mark(self, sources):
+        self._file.write(''.join(f"{source}\n" for source in sources))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+class JsonlWriter:
+    def __init__(self, path):
+        self._file = open(path, 'a')
+
+    def write(self, records):
+        self._file.write(''.join(json.dumps(record) + '\n' for record in records))
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def parquet_schema():
+    """Fixed schema of the output records, so every part has the same columns (error rows leave them null)"""
+    import pyarrow as pa
+    # max_energy is the detector's two-decimal label, a string as in the JSON output
+    drop = pa.struct([('type', pa.string()), ('start', pa.float64()), ('end', pa.float64()), ('max_energy', pa.string())])
+    return pa.schema([
+        ('source', pa.string()),
+        ('status', pa.string()),
+        ('message', pa.string()),
+        ('max_sample', pa.int64()),
+        ('min_sample', pa.int64()),
+        ('bit_depth', pa.int64()),
+        ('sample_rate', pa.int64()),
+        ('duration', pa.float64()),
+        ('drops', pa.list_(drop)),
+        ('is_clean', pa.bool_()),
+        ('drop_count', pa.int64()),
+        ('analysis_seconds', pa.float64())
+    ])
+
+
+class ParquetWriter:
+    """Each flush becomes a new part file in the output directory, so resumed runs append parts"""
+
+    def __init__(self, path):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise SystemExit("Parquet output needs pyarrow (pip install pyarrow)")
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.schema = parquet_schema()
+        self._part = len(glob.glob(os.path.join(path, 'part-*.parquet')))
+
+    def write(self, records):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        table = pa.Table.from_pylist(records, schema=self.schema)
+        pq.write_table(table, os.path.join(self.path, f"part-{self._part:05d}.parquet"))
+        self._part += 1
+
+    def close(self):
+        pass
+
+
+def report(done, audio_seconds, errors, elapsed, total):
+    print(
+        f"{done}/{total} files, {errors} errors | "
+        f"{done / elapsed:.2f} files/s, {audio_seconds / 3600 / elapsed:.4f} audio-hours/s",
+        file=sys.stderr, flush=True
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-analyze a corpus of recordings for frame drops")
+    parser.add_argument('locations', nargs='+', help="directories, files or s3://bucket/prefix")
+    parser.add_argument('--out', required=True, help="JSONL file, or directory for --format parquet")
+    parser.add_argument('--format', choices=['jsonl', 'parquet'], default='jsonl')
+    parser.add_argument('--pattern', default='*.wav', help="file name pattern (default *.wav)")
+    parser.add_argument('--threshold', type=float, default=THRESHOLD)
+    parser.add_argument('--cutoff-freq', type=float, default=CUTOFF_FREQ)
+    parser.add_argument('--frame-length', type=int, default=FRAME_LENGTH)
+    parser.add_argument('--hop-length', type=int, default=HOP_LENGTH)
+    parser.add_argument('--stream-min-seconds', type=float, default=60,
+                        help="analyze recordings at least this long block by block")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--flush-every', type=int, default=100, help="records per write (and Parquet part)")
+    parser.add_argument('--report-every', type=float, default=10, help="seconds between progress lines")
+    args = parser.parse_args(argv)
+
+    params = {
+        'threshold': args.threshold,
+        'cutoff_freq': args.cutoff_freq,
+        'frame_length': args.frame_length,
+        'hop_length': args.hop_length,
+        'stream_min_seconds': args.stream_min_seconds
+    }
+    checkpoint = Checkpoint(f"{args.out.rstrip('/')}.checkpoint", params)
+    pending = [source for source in list_sources(args.locations, args.pattern) if source not in checkpoint.done]
+    print(f"{len(pending)} sources to analyze ({len(checkpoint.done)} already done)", file=sys.stderr)
+
+    writer = ParquetWriter(args.out) if args.format == 'parquet' else JsonlWriter(args.out)
+    done = errors = 0
+    audio_seconds = 0.0
+    batch = []
+    start = last_report = time.perf_counter()
+
+    def flush():
+        # Results first, checkpoint second: a crash in between re-analyzes, never skips.
+        # Failed sources stay off the checkpoint, so a resume retries them.
+        if batch:
+            writer.write(batch)
+            checkpoint.mark(record['source'] for record in batch if record['status'] != 'error')
+            batch.clear()
+
+    try:
+        with multiprocessing.Pool(args.workers) as pool:
+            for record in pool.imap_unordered(analyze_source, ((source, params) for source in pending)):
+                batch.append(record)
+                done += 1
+                errors += record['status'] == 'error'
+                audio_seconds += record.get('duration') or 0.0
+                if len(batch) >= args.flush_every:
+                    flush()
+                if time.perf_counter() - last_report >= args.report_every:
+                    report(done, audio_seconds, errors, time.perf_counter() - start, len(pending))
+                    last_report = time.perf_counter()
+    finally:
+        flush()
+        writer.close()
+        checkpoint.close()
+
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    report(done, audio_seconds, errors, elapsed, len(pending))
+    print(json.dumps({
+        'files': done,
+        'errors': errors,
+        'audio_hours': audio_seconds / 3600,
+        'elapsed_seconds': elapsed,
+        'files_per_second': done / elapsed,
+        'audio_hours_per_second': audio_seconds / 3600 / elapsed
+    }))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,319 @@
+"""
+Benchmark for the audio analysis hot path: analyze_audio, analyze_audio_stream,
+detect_drops, generate_analysis_image and the resample step of medical submissions.
+
+    python bench_analysis.py --out bench.json
+    python bench_analysis.py --durations 10 --sample-rates 48000 --repeat 5 --stages analyze_audio,resample
+
+The corpus is synthetic WAVs over every combination of --durations, --sample-rates,
+--subtypes and --channels, each with --drops single-sample clicks (high-frequency
+frame drops), plus the recordings in medical_audio_storage/audio and any --files.
+Synthetic files are generated from a fixed seed into --corpus-dir, so runs on
+different commits measure the same audio.
+
+Each (file, stage) pair runs in a fresh process forked from a warmed-up parent,
+so peak RSS is per stage and imports are not timed. The JSON report has, per
+file and stage, the median and min time over --repeat runs, the realtime factor
+(audio seconds per second) and peak RSS, plus per-stage totals.
+
+--check-float64 also analyzes every file with the float64 pipeline and checks that
+the drops and is_clean decisions of the float32 pipeline match it, for both
+analyze_audio and analyze_audio_stream; the exit status is 1 if any differ.
+test_audio_analysis.py asserts the same on a fixed synthetic corpus.
+"""
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import soundfile as sf
+from audio_analysis import (AudioAnalysis, CUTOFF_FREQ, THRESHOLD, analyze_audio, analyze_audio_stream,
+                            detect_drops, generate_analysis_image, warm_up)
+from resampling import RESAMPLE_QUALITY, resample_audio
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SAMPLE_AUDIO_GLOB = os.path.join(HERE, 'medical_audio_storage', 'audio', '*.wav')
+STAGES = ['analyze_audio', 'analyze_audio_stream', 'detect_drops', 'generate_analysis_image', 'resample']
+
+
+def synthesize(path, duration, sr, subtype, channels, drops, seed=0):
+    """
+    Write a voiced-like test recording: harmonics of 140 Hz with a slow envelope and
+    faint broadband noise, and `drops` full-scale one-sample clicks spread evenly
+    through it (each lights up the band above CUTOFF_FREQ for one or two frames).
+    """
+    rng = np.random.default_rng(seed)
+    n = int(duration * sr)
+    t = np.arange(n) / sr
+    envelope = (0.5 + 0.5 * np.sin(2 * np.pi * 0.7 * t)) ** 2
+    signal = np.zeros(n)
+    for k in range(1, 12):
+        if 140 * k < sr / 2:
+            signal += np.sin(2 * np.pi * 140 * k * t) / k
+    signal = 0.3 * envelope * signal / max(np.max(np.abs(signal)), 1e-9)
+    signal += 1e-4 * rng.standard_normal(n)
+    if drops and n:
+        signal[np.linspace(0.05 * n, 0.95 * n, drops).astype(int)] = 0.99
+    # Later channels are quieter copies; analysis reads the first channel only
+    audio = np.stack([signal * 0.8 ** c for c in range(channels)], axis=1)
+    sf.write(path, audio, sr, subtype=subtype, format='WAV')
+
+
+def synthetic_corpus(corpus_dir, durations, sample_rates, subtypes, channels, drops):
+    """Generate (once) and describe the synthetic files"""
+    os.makedirs(corpus_dir, exist_ok=True)
+    files = []
+    for duration in durations:
+        for sr in sample_rates:
+            for subtype in subtypes:
+                for channel_count in channels:
+                    name = f"syn_{duration:g}s_{sr}_{subtype}_{channel_count}ch_{drops}drops.wav"
+                    path = os.path.join(corpus_dir, name)
+                    if not os.path.exists(path):
+                        synthesize(path, duration, sr, subtype, channel_count, drops)
+                    files.append({
+                        'name': name,
+                        'source': path,
+                        # There is no band above the cutoff below 2 * CUTOFF_FREQ
+                        'injected_drops': drops if sr > 2 * CUTOFF_FREQ else 0
+                    })
+    return files
+
+
+def sample_files(paths):
+    return [{'name': os.path.basename(path), 'source': path, 'injected_drops': None} for path in paths]
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux, bytes on macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2**20
+
+
+def current_rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except OSError:
+        return None
+
+
+def run_stage(task):
+    """
+    Pool worker (one task per process): time one stage on one file `repeat` times.
+    Setup a stage depends on (the STFT for detect_drops and the image) is not timed.
+    """
+    source, stage, params = task
+    baseline = current_rss_mb()
+    seconds = []
+    extra = {}
+    for _ in range(params['repeat']):
+        if stage == 'analyze_audio':
+            start = time.perf_counter()
+            results = analyze_audio(AudioAnalysis(source))
+        elif stage == 'analyze_audio_stream':
+            start = time.perf_counter()
+            results = analyze_audio_stream(source)
+        elif stage == 'detect_drops':
+            energy = AudioAnalysis(source).high_freq_energy
+            start = time.perf_counter()
+            detect_drops(energy, THRESHOLD)
+        elif stage == 'generate_analysis_image':
+            analysis = AudioAnalysis(source)
+            drops = analyze_audio(analysis).get('drops')
+            start = time.perf_counter()
+            generate_analysis_image(analysis, drops, params['image_quality'])
+        elif stage == 'resample':
+            if sf.info(source).samplerate == params['target_sr']:
+                return {'skipped': 'already at the target sample rate'}
+            start = time.perf_counter()
+            resample_audio(source, params['target_sr'], params['resample_quality'])
+        else:
+            raise ValueError(f"Unknown stage {stage}")
+        seconds.append(time.perf_counter() - start)
+
+        if stage.startswith('analyze_audio'):
+            if results.get('status') == 'error':
+                return {'error': results['message']}
+            extra['detected_drops'] = len(results['drops'])
+
+    peak = peak_rss_mb()
+    return {
+        'median_seconds': statistics.median(seconds),
+        'min_seconds': min(seconds),
+        'peak_rss_mb': peak,
+        'rss_growth_mb': None if baseline is None else peak - baseline,
+        **extra
+    }
+
+
+def check_float64(source):
+    """Compare the float32 pipeline's drop decisions with float64 on one file"""
+    paths = {
+        'analyze_audio': lambda dtype: analyze_audio(AudioAnalysis(source, dtype=dtype)),
+        'analyze_audio_stream': lambda dtype: analyze_audio_stream(source, dtype=dtype)
+    }
+    outcome = {}
+    for name, analyze in paths.items():
+        single, double = analyze(np.float32), analyze(np.float64)
+        if 'status' in single or 'status' in double:
+            outcome[name] = {'match': single == double, 'error': double.get('message') or single.get('message')}
+            continue
+        drops_match = [(d['start'], d['end']) for d in single['drops']] == [(d['start'], d['end']) for d in double['drops']]
+        outcome[name] = {
+            'match': drops_match and single['is_clean'] == double['is_clean'],
+            'drops': len(double['drops']),
+            'max_energy_labels_differing': sum(
+                a['max_energy'] != b['max_energy'] for a, b in zip(single['drops'], double['drops'])
+            )
+        }
+
+    # How far float32 moves the energy, against how close float64 comes to the threshold
+    energy32 = AudioAnalysis(source, dtype=np.float32).high_freq_energy
+    energy64 = AudioAnalysis(source, dtype=np.float64).high_freq_energy
+    if len(energy64):
+        outcome['energy_max_abs_diff'] = float(np.max(np.abs(energy32 - energy64)))
+        outcome['closest_to_threshold'] = float(np.min(np.abs(energy64 - THRESHOLD)))
+    return outcome
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def split_list(value, cast=str):
+    return [cast(item) for item in value.split(',') if item]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the audio analysis hot path")
+    parser.add_argument('--durations', type=lambda v: split_list(v, float), default=[5.0, 30.0, 120.0],
+                        help="synthetic durations in seconds (comma separated)")
+    parser.add_argument('--sample-rates', type=lambda v: split_list(v, int), default=[16000, 44100, 48000, 96000])
+    parser.add_argument('--subtypes', type=split_list, default=['PCM_16', 'PCM_24'])
+    parser.add_argument('--channels', type=lambda v: split_list(v, int), default=[1, 2])
+    parser.add_argument('--drops', type=int, default=5, help="clicks injected per synthetic file")
+    parser.add_argument('--corpus-dir', default=os.path.join(tempfile.gettempdir(), 'audio-bench-corpus'))
+    parser.add_argument('--files', nargs='*', default=None,
+                        help="real recordings to include (default: medical_audio_storage/audio)")
+    parser.add_argument('--stages', type=split_list, default=STAGES)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--image-quality', choices=['high', 'fast'], default='high')
+    parser.add_argument('--target-sr', type=int, default=16000, help="resample target (the medical form's frequency)")
+    parser.add_argument('--resample-quality', default=RESAMPLE_QUALITY)
+    parser.add_argument('--check-float64', action='store_true',
+                        help="check the float32 pipeline's drop decisions against float64")
+    parser.add_argument('--out', help="also write the JSON report here")
+    args = parser.parse_args(argv)
+
+    unknown = set(args.stages) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stages {sorted(unknown)}; choose from {STAGES}")
+
+    files = synthetic_corpus(args.corpus_dir, args.durations, args.sample_rates, args.subtypes,
+                             args.channels, args.drops)
+    files += sample_files(sorted(glob.glob(SAMPLE_AUDIO_GLOB)) if args.files is None else args.files)
+
+    skipped = []
+    for entry in list(files):
+        try:
+            info = sf.info(entry['source'])
+        except Exception as e:
+            skipped.append({'source': entry['source'], 'error': str(e)})
+            files.remove(entry)
+            continue
+        entry.update(sample_rate=info.samplerate, subtype=info.subtype, channels=info.channels,
+                     duration=info.duration, stages={})
+
+    # Load librosa's STFT stack and the renderer once; every stage process is forked from here
+    warm_up(args.image_quality)
+    params = {
+        'repeat': args.repeat,
+        'image_quality': args.image_quality,
+        'target_sr': args.target_sr,
+        'resample_quality': args.resample_quality
+    }
+
+    start = time.perf_counter()
+    tasks = [(entry['source'], stage, params) for entry in files for stage in args.stages]
+    with multiprocessing.get_context('fork').Pool(1, maxtasksperchild=1) as pool:
+        for (source, stage, _), result in zip(tasks, pool.imap(run_stage, tasks)):
+            entry = next(entry for entry in files if entry['source'] == source)
+            if 'median_seconds' in result:
+                result['realtime_factor'] = entry['duration'] / max(result['median_seconds'], 1e-12)
+            entry['stages'][stage] = result
+            print(f"{entry['name']} {stage}: {json.dumps(result)}", file=sys.stderr, flush=True)
+    elapsed = time.perf_counter() - start
+
+    summary = {}
+    for stage in args.stages:
+        timed = [entry for entry in files if 'median_seconds' in entry['stages'].get(stage, {})]
+        if not timed:
+            continue
+        seconds = sum(entry['stages'][stage]['median_seconds'] for entry in timed)
+        audio_seconds = sum(entry['duration'] for entry in timed)
+        summary[stage] = {
+            'files': len(timed),
+            'total_seconds': seconds,
+            'audio_seconds': audio_seconds,
+            'realtime_factor': audio_seconds / max(seconds, 1e-12),
+            'files_per_second': len(timed) / max(seconds, 1e-12),
+            'max_peak_rss_mb': max(entry['stages'][stage]['peak_rss_mb'] for entry in timed),
+            'max_rss_growth_mb': max((entry['stages'][stage]['rss_growth_mb'] or 0) for entry in timed)
+        }
+
+    mismatched = [
+        entry['name'] for entry in files
+        if entry['injected_drops'] is not None
+        and entry['stages'].get('analyze_audio', {}).get('detected_drops', entry['injected_drops']) != entry['injected_drops']
+    ]
+
+    # After the stage processes are done, so the float64 runs do not inflate their RSS
+    float64_check = None
+    if args.check_float64:
+        results = {entry['name']: check_float64(entry['source']) for entry in files}
+        float64_check = {
+            'files': len(results),
+            'mismatches': [
+                name for name, outcome in results.items()
+                if not all(outcome[path]['match'] for path in ('analyze_audio', 'analyze_audio_stream'))
+            ],
+            'results': results
+        }
+
+    report = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'cpu_count': os.cpu_count(),
+        'params': {**params, 'stages': args.stages, 'drops': args.drops},
+        'elapsed_seconds': elapsed,
+        'summary': summary,
+        'drop_detection_mismatches': mismatched,
+        'float64_check': float64_check,
+        'files': files,
+        'skipped': skipped
+    }
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(output + '\n')
+    print(output)
+    if float64_check and float64_check['mismatches']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""
+Startup benchmark: how long a fresh process takes to import the app, which
+modules dominate that time, and (with --serve) how long a real server takes
+to answer /healthz and then /readyz.
+
+    python bench_startup.py --runs 10
+    python bench_startup.py --runs 5 --serve --port 8765
+
+Every measurement is a new interpreter, so nothing is cached in-process.
+Prints one JSON document.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+IMPORT_SNIPPET = (
+    "import time; start = time.perf_counter(); import {module}; "
+    "print(time.perf_counter() - start)"
+)
+
+
+def time_import(module, env):
+    """Seconds a fresh interpreter spends importing module"""
+    out = subprocess.run(
+        [sys.executable, '-c', IMPORT_SNIPPET.format(module=module)],
+        cwd=HERE, env=env, capture_output=True, text=True, check=True
+    )
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def top_imports(module, env, limit):
+    """Modules imported directly by module, by cumulative import time (python -X importtime)"""
+    out = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+        cwd=HERE, env=env, capture_output=True, text=True, check=True
+    )
+    packages = {}
+    children = {}
+    for line in out.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, name = line.split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        # importtime prints children before their parent, indented one level deeper
+        children.setdefault(depth, {})[name.strip()] = int(cumulative_us) / 1e6
+        if depth == 0 and name.strip() == module:
+            packages = children.get(1, {})
+        children.pop(depth + 1, None)
+    ranked = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:limit]
+    return [{'module': name, 'seconds': seconds} for name, seconds in ranked]
+
+
+def wait_for(url, status, deadline):
+    """Seconds until url answers with status, or None at the deadline"""
+    start = time.perf_counter()
+    while time.perf_counter() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == status:
+                    return time.perf_counter() - start
+        except urllib.error.HTTPError as e:
+            if e.code == status:
+                return time.perf_counter() - start
+        except OSError:
+            pass
+        time.sleep(0.02)
+    return None
+
+
+def time_serve(module, port, env, timeout):
+    """Seconds from launching uvicorn to the first /healthz 200 and the first /readyz 200"""
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', f"{module}:app", '--port', str(port), '--log-level', 'warning'],
+        cwd=HERE, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    start = time.perf_counter()
+    try:
+        deadline = start + timeout
+        live = wait_for(f"http://127.0.0.1:{port}/healthz", 200, deadline)
+        ready = wait_for(f"http://127.0.0.1:{port}/readyz", 200, deadline)
+        return {
+            'healthz_seconds': live,
+            'readyz_seconds': None if ready is None else time.perf_counter() - start
+        }
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def summarize(samples):
+    return {
+        'median': statistics.median(samples),
+        'min': min(samples),
+        'max': max(samples),
+        'runs': len(samples)
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure cold start time of the app")
+    parser.add_argument('--module', default='app_uvicorn')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15, help="slowest direct imports of --module to list")
+    parser.add_argument('--serve', action='store_true', help="also time /healthz and /readyz under uvicorn")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--timeout', type=float, default=120)
+    args = parser.parse_args(argv)
+
+    # Keep background job workers out of the measurement
+    env = dict(os.environ, JOB_WORKERS=os.getenv('JOB_WORKERS', '0'))
+
+    result = {
+        'module': args.module,
+        'python': sys.version.split()[0],
+        'import_seconds': summarize([time_import(args.module, env) for _ in range(args.runs)]),
+        'top_imports': top_imports(args.module, env, args.top)
+    }
+    if args.serve:
+        serves = [time_serve(args.module, args.port, env, args.timeout) for _ in range(args.runs)]
+        for key in ('healthz_seconds', 'readyz_seconds'):
+            samples = [serve[key] for serve in serves if serve[key] is not None]
+            result[key] = summarize(samples) if samples else None
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
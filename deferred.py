@@ -0,0 +1,34 @@
+import threading
+
+
+class Deferred:
+    """
+    Stand-in for an object that is slow to build (the S3 client, the MongoDB
+    client and its collections). The factory runs once, on first attribute
+    access, item access or get(), so importing the app never waits on it.
+    Safe to first use from several threads at once.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._value = None
+        self._built = False
+        self._lock = threading.Lock()
+
+    @property
+    def built(self):
+        return self._built
+
+    def get(self):
+        if not self._built:
+            with self._lock:
+                if not self._built:
+                    self._value = self._factory()
+                    self._built = True
+        return self._value
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+    def __getitem__(self, key):
+        return self.get()[key]
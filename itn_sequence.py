@@ -0,0 +1,87 @@
+import re
+import sqlite3
+from contextlib import closing
+
+
+def highest_itn_sequence(s3_client, bucket, locale):
+    """
+    Highest ITN sequence number already used in S3 for a locale, across the
+    original/ and modified/ prefixes. Follows pagination past 1000 keys.
+    """
+    pattern = re.compile(r'audio_' + re.escape(locale) + r'_ITN_(\d{4})\.')
+    paginator = s3_client.get_paginator('list_objects_v2')
+    highest = 0
+    for prefix in (f"original/audio_{locale}_ITN_", f"modified/audio_{locale}_ITN_"):
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            for obj in page.get('Contents', []):
+                match = pattern.search(obj['Key'])
+                if match:
+                    highest = max(highest, int(match.group(1)))
+    return highest
+
+
+class MongoSequenceCounter:
+    """
+    Atomic named counters in a MongoDB collection, one document per name.
+    Once seeded, every allocation is a single findOneAndUpdate round trip.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def next(self, name, seed):
+        """
+        Return the next value of counter `name`. On first use the counter is
+        seeded with seed() (the highest value already taken); $max makes
+        concurrent seeding from several workers safe.
+        """
+        from pymongo import ReturnDocument
+        from pymongo.errors import DuplicateKeyError
+
+        for _ in range(3):
+            doc = self.collection.find_one_and_update(
+                {'_id': name, 'seeded': True},
+                {'$inc': {'seq': 1}},
+                return_document=ReturnDocument.AFTER
+            )
+            if doc is not None:
+                return doc['seq']
+
+            try:
+                self.collection.update_one(
+                    {'_id': name},
+                    {'$max': {'seq': seed()}, '$set': {'seeded': True}},
+                    upsert=True
+                )
+            except DuplicateKeyError:
+                pass  # Another worker seeded it first
+
+        raise RuntimeError(f"Could not allocate a value for counter {name}")
+
+
+class SQLiteSequenceCounter:
+    """Same interface as MongoSequenceCounter, backed by a local SQLite file for offline runs"""
+
+    def __init__(self, path):
+        self.path = path
+        with closing(self._connect()) as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS sequences (name TEXT PRIMARY KEY, seq INTEGER NOT NULL)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def next(self, name, seed):
+        with closing(self._connect()) as conn:
+            if conn.execute("SELECT 1 FROM sequences WHERE name = ?", (name,)).fetchone() is None:
+                start = seed()
+                conn.execute("INSERT OR IGNORE INTO sequences (name, seq) VALUES (?, ?)", (name, start))
+
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("UPDATE sequences SET seq = seq + 1 WHERE name = ?", (name,))
+                seq = conn.execute("SELECT seq FROM sequences WHERE name = ?", (name,)).fetchone()[0]
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            return seq
@@ -0,0 +1,316 @@
+import importlib
+import json
+import multiprocessing
+import os
+import random
+import sqlite3
+import threading
+import time
+import traceback
+from contextlib import closing
+
+
+class PermanentJobError(Exception):
+    """Raised by a job handler for failures a retry cannot fix (e.g. undecodable audio)"""
+
+
+class JobQueue:
+    """
+    Durable job queue in a local SQLite file, shared by the web workers that
+    enqueue and the worker processes that run jobs.
+
+    Each job is keyed by an idempotency key (the submission_id for medical
+    submissions): enqueueing a key that already exists is a no-op. A claimed
+    job is leased for lease_seconds; if its worker dies the lease runs out and
+    another worker picks it up. Failed attempts are retried with exponential
+    backoff until max_attempts, then the job is parked as 'dead': a dead letter
+    that requeue() runs again once the outage behind it is over. A job whose
+    handler raises PermanentJobError is marked 'failed' straight away.
+    """
+
+    def __init__(self, path, max_attempts=5, backoff_base=2.0, backoff_max=300.0, lease_seconds=600):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.lease_seconds = lease_seconds
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY,"
+                " kind TEXT NOT NULL,"
+                " payload TEXT NOT NULL,"
+                " status TEXT NOT NULL,"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " max_attempts INTEGER NOT NULL,"
+                " run_after REAL NOT NULL,"
+                " locked_until REAL,"
+                " last_error TEXT,"
+                " result TEXT,"
+                " created_at REAL NOT NULL,"
+                " updated_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, run_after)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def enqueue(self, job_id, kind, payload, max_attempts=None):
+        """Add a job; returns False if a job with this id already exists"""
+        now = time.time()
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO jobs (id, kind, payload, status, max_attempts, run_after, created_at, updated_at)"
+                " VALUES (?, ?, ?, 'queued', ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(payload, default=str), max_attempts or self.max_attempts, now, now, now)
+            )
+            return cursor.rowcount == 1
+
+    def claim(self):
+        """
+        Lease the next runnable job: a queued job whose backoff has elapsed, or a
+        running job whose lease expired. Returns (id, kind, payload, attempt) or None.
+        An expired lease on a job with no attempts left (its worker keeps dying,
+        e.g. OOM-killed) parks the job as dead instead of running it again.
+        """
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "UPDATE jobs SET status = 'dead', last_error = ?, locked_until = NULL, updated_at = ?"
+                    " WHERE status = 'running' AND locked_until <= ? AND attempts >= max_attempts",
+                    ("Worker stopped during the last attempt (lease expired)", now, now)
+                )
+                row = conn.execute(
+                    "SELECT id, kind, payload, attempts FROM jobs"
+                    " WHERE (status = 'queued' AND run_after <= ?) OR (status = 'running' AND locked_until <= ?)"
+                    " ORDER BY run_after LIMIT 1",
+                    (now, now)
+                ).fetchone()
+                if row is not None:
+                    conn.execute(
+                        "UPDATE jobs SET status = 'running', attempts = attempts + 1, locked_until = ?, updated_at = ?"
+                        " WHERE id = ?",
+                        (now + self.lease_seconds, now, row[0])
+                    )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+        if row is None:
+            return None
+        job_id, kind, payload, attempts = row
+        return job_id, kind, json.loads(payload), attempts + 1
+
+    def complete(self, job_id, result=None):
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'done', result = ?, last_error = NULL, locked_until = NULL, updated_at = ?"
+                " WHERE id = ?",
+                (json.dumps(result, default=str), time.time(), job_id)
+            )
+
+    def fail(self, job_id, error, permanent=False):
+        """
+        Record a failed attempt: schedule a retry with backoff, or (permanent, or out
+        of attempts) stop retrying. Returns True if the job will not run again.
+        """
+        now = time.time()
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT attempts, max_attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return False
+            attempts, max_attempts = row
+            if permanent or attempts >= max_attempts:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, last_error = ?, locked_until = NULL, updated_at = ? WHERE id = ?",
+                    ('failed' if permanent else 'dead', error, now, job_id)
+                )
+                return True
+            else:
+                delay = min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1)) * random.uniform(0.5, 1.0)
+                conn.execute(
+                    "UPDATE jobs SET status = 'queued', last_error = ?, run_after = ?, locked_until = NULL, updated_at = ?"
+                    " WHERE id = ?",
+                    (error, now + delay, now, job_id)
+                )
+                return False
+
+    def requeue(self, job_id):
+        """Give a dead job a fresh set of attempts; returns False unless the job was dead"""
+        now = time.time()
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'queued', attempts = 0, run_after = ?, locked_until = NULL, updated_at = ?"
+                " WHERE id = ? AND status = 'dead'",
+                (now, now, job_id)
+            )
+            return cursor.rowcount == 1
+
+    def status(self, job_id):
+        """Job state for the status endpoint, or None if the id is unknown"""
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT id, kind, status, attempts, max_attempts, last_error, result, created_at, updated_at"
+                " FROM jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        job_id, kind, status, attempts, max_attempts, last_error, result, created_at, updated_at = row
+        return {
+            'id': job_id,
+            'kind': kind,
+            'status': status,
+            'attempts': attempts,
+            'max_attempts': max_attempts,
+            'last_error': last_error,
+            'result': json.loads(result) if result is not None else None,
+            'created_at': created_at,
+            'updated_at': updated_at
+        }
+
+    def counts(self):
+        with closing(self._connect()) as conn:
+            return dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+
+def run_worker(queue, handlers, stop_event=None, poll_interval=0.5, failure_handlers=None):
+    """
+    Claim and run jobs until stop_event is set. handlers maps a job kind to a
+    function taking the job payload; its return value is stored as the result.
+    failure_handlers optionally maps a job kind to a function taking the payload,
+    called when the handler raises PermanentJobError (e.g. to remove files the job
+    owned). Jobs that run out of attempts keep their files so they can be requeued.
+    """
+    while stop_event is None or not stop_event.is_set():
+        job = queue.claim()
+        if job is None:
+            if stop_event is not None:
+                stop_event.wait(poll_interval)
+            else:
+                time.sleep(poll_interval)
+            continue
+
+        job_id, kind, payload, attempt = job
+        try:
+            handler = handlers.get(kind)
+            if handler is None:
+                raise PermanentJobError(f"No handler for job kind {kind}")
+            result = handler(payload)
+        except PermanentJobError as e:
+            print(f"Job {job_id} ({kind}) failed permanently: {e}")
+            queue.fail(job_id, str(e), permanent=True)
+            on_failure = (failure_handlers or {}).get(kind)
+            if on_failure is not None:
+                try:
+                    on_failure(payload)
+                except Exception as e:
+                    print(f"Job {job_id} ({kind}) failure handler failed: {e}")
+        except Exception as e:
+            print(f"Job {job_id} ({kind}) attempt {attempt} failed: {e}")
+            traceback.print_exc()
+            if queue.fail(job_id, str(e)):
+                print(f"Job {job_id} ({kind}) is out of attempts; parked as dead until requeued")
+        else:
+            queue.complete(job_id, result)
+
+
+def _worker_main(queue_kwargs, handlers_module, stop_event, poll_interval):
+    # Handlers are looked up by module name so spawned workers can import them
+    module = importlib.import_module(handlers_module)
+    failure_handlers = getattr(module, 'JOB_FAILURE_HANDLERS', None)
+    run_worker(JobQueue(**queue_kwargs), module.JOB_HANDLERS, stop_event, poll_interval, failure_handlers)
+
+
+class JobWorkers:
+    """
+    Worker processes running jobs from a JobQueue. handlers_module names a
+    module with a JOB_HANDLERS dict, and optionally a JOB_FAILURE_HANDLERS dict
+    (see run_worker); each worker imports it on start-up.
+    start_method 'thread' runs the workers as threads of this process instead,
+    sharing its state (e.g. an in-memory mongomock database) at the cost of
+    running job work under the web process's GIL.
+    A supervisor thread checks every supervise_interval seconds for workers that
+    have died (e.g. OOM-killed) and starts replacements, so the queue keeps draining.
+    """
+
+    def __init__(self, queue, count, handlers_module, start_method=None, poll_interval=0.5,
+                 supervise_interval=5.0):
+        self.queue = queue
+        self.count = count
+        self.handlers_module = handlers_module
+        self.poll_interval = poll_interval
+        self.supervise_interval = supervise_interval
+        if start_method == 'thread':
+            self._context = None
+        else:
+            self._context = multiprocessing.get_context(start_method) if start_method else multiprocessing
+        self._stop_event = None
+        self._processes = []
+        self._supervisor = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        if self._processes:
+            return
+        self._stop_event = self._context.Event() if self._context else threading.Event()
+        with self._lock:
+            self._processes = [self._start_worker(i) for i in range(self.count)]
+        if self.count:
+            self._supervisor = threading.Thread(target=self._supervise, name="job-worker-supervisor", daemon=True)
+            self._supervisor.start()
+
+    def _start_worker(self, i):
+        queue_kwargs = {
+            'path': os.path.abspath(self.queue.path),
+            'max_attempts': self.queue.max_attempts,
+            'backoff_base': self.queue.backoff_base,
+            'backoff_max': self.queue.backoff_max,
+            'lease_seconds': self.queue.lease_seconds
+        }
+        worker_class = self._context.Process if self._context else threading.Thread
+        process = worker_class(
+            target=_worker_main,
+            args=(queue_kwargs, self.handlers_module, self._stop_event, self.poll_interval),
+            name=f"job-worker-{i}",
+            daemon=True
+        )
+        process.start()
+        return process
+
+    def _supervise(self):
+        while not self._stop_event.wait(self.supervise_interval):
+            self.respawn_dead()
+
+    def respawn_dead(self):
+        """Replace workers that have exited; returns how many were replaced"""
+        replaced = 0
+        with self._lock:
+            for i, process in enumerate(self._processes):
+                if process.is_alive() or self._stop_event.is_set():
+                    continue
+                exitcode = getattr(process, 'exitcode', None)
+                print(f"Job worker {process.name} died (exit code {exitcode}), starting a new one")
+                self._processes[i] = self._start_worker(i)
+                replaced += 1
+        return replaced
+
+    def shutdown(self, timeout=30):
+        """Let running jobs finish (up to timeout), then stop the workers"""
+        if not self._processes:
+            return
+        self._stop_event.set()
+        if self._supervisor is not None:
+            self._supervisor.join()
+            self._supervisor = None
+        deadline = time.monotonic() + timeout
+        for process in self._processes:
+            process.join(max(0, deadline - time.monotonic()))
+            if process.is_alive() and self._context:
+                process.terminate()
+                process.join()
+        self._processes = []
@@ -0,0 +1,388 @@
+"""
+Load test: N concurrent recorders against one uvicorn process running the app,
+with local stand-ins for its dependencies.
+
+    python loadtest.py --concurrency 1,2,4,8,16,32 --stage-seconds 30 --out load.json
+    python loadtest.py --url http://127.0.0.1:7000 --concurrency 4,8   # an already running server
+
+Unless --url is given, the harness starts:
+- moto's S3 server with the audio-sourcing-itn bucket;
+- an in-process SMTP sink (aiosmtpd) that accepts and counts report emails;
+- uvicorn app_uvicorn:app with MONGODB_URI=mongomock:// (or --mongodb-uri) and
+  its queue, spool and output folders in a temporary directory.
+
+With mongomock the job workers run as threads of the server
+(JOB_START_METHOD=thread), so they share its in-memory database.
+
+Each recorder loops over a weighted --mix of /save_audio, /resave_audio,
+/checkfails/<speaker_id>/<country> and /api/submit-medical-audio. Every take is
+a unique WAV, so the analysis cache does not hide the work. Concurrency is
+stepped through --concurrency. For each step the report gives throughput,
+latency percentiles, the error and 503 rates per endpoint, and the server's
+mean time per pipeline stage (from /metrics). "knee" is the last step that
+still raised throughput by --knee-gain over the step before it.
+"""
+import argparse
+import base64
+import json
+import logging
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from io import BytesIO
+import numpy as np
+import requests
+import soundfile as sf
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BUCKET = 'audio-sourcing-itn'
+OPERATIONS = ['save', 'resave', 'checkfails', 'medical']
+STAGE_SAMPLE = re.compile(r'^audio_pipeline_stage_seconds_(sum|count)\{stage="([^"]+)"\} (\S+)$')
+LAG_SAMPLE = re.compile(r'^event_loop_lag_seconds_(sum|count) (\S+)$')
+
+
+def make_take(seconds, sr, clicks, seed):
+    """A PCM_16 WAV: a modulated 220 Hz tone over faint noise, with `clicks` frame drops"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sr)) / sr
+    audio = 0.3 * np.sin(2 * np.pi * 220 * t) * (0.5 + 0.5 * np.sin(2 * np.pi * 0.5 * t))
+    audio += 1e-4 * rng.standard_normal(len(t))
+    if clicks:
+        audio[(np.linspace(0.1, 0.9, clicks) * len(t)).astype(int)] = 0.99
+    take = BytesIO()
+    sf.write(take, audio, sr, format='WAV', subtype='PCM_16')
+    return take.getvalue()
+
+
+def unique_take(base, rng):
+    """Flip the low bit of a few samples in the second half: inaudible, but a new cache key"""
+    take = bytearray(base)
+    for _ in range(16):
+        take[rng.randrange(len(take) // 2, len(take) - 1) & ~1] ^= 1
+    return bytes(take)
+
+
+class SMTPSink:
+    """Accepts every message and counts them"""
+
+    def __init__(self, port):
+        from aiosmtpd.controller import Controller
+        self.messages = 0
+        self.controller = Controller(self, hostname='127.0.0.1', port=port)
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages += 1
+        return '250 OK'
+
+    def start(self):
+        self.controller.start()
+
+    def stop(self):
+        self.controller.stop()
+
+
+def start_s3(port):
+    import boto3
+    from moto.server import ThreadedMotoServer
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)  # one line per S3 request otherwise
+    server = ThreadedMotoServer(ip_address='127.0.0.1', port=port, verbose=False)
+    server.start()
+    boto3.client(
+        's3', endpoint_url=f"http://127.0.0.1:{port}", region_name='us-east-1',
+        aws_access_key_id='test', aws_secret_access_key='test'
+    ).create_bucket(Bucket=BUCKET)
+    return server
+
+
+def wait_ready(base_url, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f"{base_url}/readyz", timeout=1).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise SystemExit(f"{base_url} was not ready after {timeout}s")
+
+
+def start_app(port, workdir, args):
+    env = dict(
+        os.environ,
+        PYTHONPATH=HERE + os.pathsep + os.environ.get('PYTHONPATH', ''),
+        MONGODB_URI=args.mongodb_uri,
+        S3_ENDPOINT_URL=f"http://127.0.0.1:{args.s3_port}",
+        AWS_ACCESS_KEY_ID='test',
+        AWS_SECRET_ACCESS_KEY='test',
+        AWS_REGION='us-east-1',
+        EMAIL_SMTP='127.0.0.1',
+        EMAIL_PORT=str(args.smtp_port),
+        EMAIL_STARTTLS='false',
+        RECIPIENT_EMAIL='reports@example.com',
+        CC_EMAIL=''
+    )
+    if args.mongodb_uri.startswith('mongomock://'):
+        env['JOB_START_METHOD'] = 'thread'
+    for setting in args.server_env:
+        key, _, value = setting.partition('=')
+        env[key] = value
+    log = open(os.path.join(workdir, 'server.log'), 'w')
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'app_uvicorn:app', '--port', str(port), '--log-level', 'warning'],
+        cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+    return server, log
+
+
+def server_metrics(base_url):
+    """{stage: (sum, count)} of the pipeline stage histogram, plus event loop lag"""
+    stages = {}
+    lag = [0.0, 0.0]
+    try:
+        text = requests.get(f"{base_url}/metrics", timeout=10).text
+    except requests.RequestException:
+        return stages, lag
+    for line in text.splitlines():
+        match = STAGE_SAMPLE.match(line)
+        if match:
+            kind, stage, value = match.groups()
+            stages.setdefault(stage, [0.0, 0.0])[kind == 'count'] = float(value)
+            continue
+        match = LAG_SAMPLE.match(line)
+        if match:
+            lag[match.group(1) == 'count'] = float(match.group(2))
+    return stages, lag
+
+
+def recorder(index, step, deadline, args, takes, base_url, results):
+    """One simulated recorder: pick an operation by weight, time it, repeat until the deadline"""
+    rng = random.Random(f"{step}-{index}")
+    session = requests.Session()
+    speaker = f"LT{step}x{index}"
+    country = 'IN'
+    saved = []
+    operations, weights = zip(*args.mix.items())
+
+    while time.perf_counter() < deadline:
+        operation = rng.choices(operations, weights)[0]
+        if operation == 'resave' and not saved:
+            operation = 'save'
+        take = unique_take(rng.choice(takes), rng)
+        data_uri = 'data:audio/wav;base64,' + base64.b64encode(take).decode() if operation in ('save', 'resave') else None
+
+        start = time.perf_counter()
+        try:
+            if operation in ('save', 'resave'):
+                sequence = f"{speaker}_{len(saved) + 1}" if operation == 'save' else rng.choice(saved)
+                body = {
+                    'dataURI': data_uri,
+                    'speakerId': speaker,
+                    'name': speaker,
+                    'gender': 'f',
+                    'age': '30',
+                    'country': country,
+                    'speakerId_sequence': sequence,
+                    'speed': 'normal',
+                    'text': 'load test'
+                }
+                response = session.post(f"{base_url}/{operation}_audio", json=body, timeout=args.timeout)
+                if operation == 'save' and response.ok:
+                    saved.append(sequence)
+            elif operation == 'checkfails':
+                response = session.get(f"{base_url}/checkfails/{speaker}/{country}", timeout=args.timeout)
+            else:
+                form = {
+                    'submissionId': uuid.uuid4().hex[:16],
+                    'speakerId': speaker,
+                    'speakerName': speaker,
+                    'speakerGender': 'f',
+                    'speakerAge': '30',
+                    'locale': 'en_IN',
+                    'deviceType': 'load-test',
+                    'frequency': str(args.target_sr),
+                    'sentenceId': str(index),
+                    'sentenceText': 'load test'
+                }
+                response = session.post(f"{base_url}/api/submit-medical-audio", data=form,
+                                        files={'audio': ('take.wav', take, 'audio/wav')}, timeout=args.timeout)
+            status, error = response.status_code, None
+        except requests.RequestException as e:
+            status, error = None, type(e).__name__
+        results.append((operation, status, error, time.perf_counter() - start))
+
+
+def summarize(samples, seconds):
+    latencies = np.array([latency for _, status, _, latency in samples if status is not None and status < 400])
+    ok = len(latencies)
+    rejected = sum(1 for _, status, _, _ in samples if status == 503)
+    errors = len(samples) - ok - rejected
+    summary = {
+        'requests': len(samples),
+        'ok': ok,
+        'rejected_503': rejected,
+        'errors': errors,
+        'error_rate': errors / len(samples) if samples else 0.0,
+        'rejected_rate': rejected / len(samples) if samples else 0.0,
+        'throughput_per_second': ok / seconds
+    }
+    if ok:
+        summary['latency_ms'] = {
+            name: float(np.percentile(latencies, q) * 1000)
+            for name, q in (('p50', 50), ('p90', 90), ('p95', 95), ('p99', 99), ('max', 100))
+        }
+    failures = {}
+    for _, status, error, _ in samples:
+        if status is None or (status >= 400 and status != 503):
+            key = error or str(status)
+            failures[key] = failures.get(key, 0) + 1
+    if failures:
+        summary['failures'] = failures
+    return summary
+
+
+def run_step(step, concurrency, args, takes, base_url):
+    before, lag_before = server_metrics(base_url)
+    results = []
+    start = time.perf_counter()
+    deadline = start + args.stage_seconds
+    threads = [
+        threading.Thread(target=recorder, args=(i, step, deadline, args, takes, base_url, results), daemon=True)
+        for i in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    after, lag_after = server_metrics(base_url)
+
+    report = {'concurrency': concurrency, 'seconds': elapsed, **summarize(results, elapsed), 'endpoints': {}}
+    for operation in OPERATIONS:
+        samples = [sample for sample in results if sample[0] == operation]
+        if samples:
+            report['endpoints'][operation] = summarize(samples, elapsed)
+
+    stages = {}
+    for stage, (total, count) in after.items():
+        total -= before.get(stage, [0.0, 0.0])[0]
+        count -= before.get(stage, [0.0, 0.0])[1]
+        if count:
+            stages[stage] = {'count': int(count), 'mean_ms': total / count * 1000}
+    report['server_stages'] = stages
+    lag_count = lag_after[1] - lag_before[1]
+    report['event_loop_lag_mean_ms'] = (lag_after[0] - lag_before[0]) / lag_count * 1000 if lag_count else None
+    return report
+
+
+def find_knee(steps, gain, max_error_rate):
+    """Last concurrency that raised throughput by at least `gain` over the step before it"""
+    knee = None
+    previous = None
+    for step in steps:
+        if step['error_rate'] > max_error_rate:
+            break
+        if previous is None or step['throughput_per_second'] >= previous * (1 + gain):
+            knee = step['concurrency']
+        previous = step['throughput_per_second']
+    return knee
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"unknown operation {name}; choose from {OPERATIONS}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the app with concurrent recorders")
+    parser.add_argument('--concurrency', type=lambda v: [int(c) for c in v.split(',')], default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument('--stage-seconds', type=float, default=30)
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix('save=6,resave=2,checkfails=1,medical=1'),
+                        help="operation weights, e.g. save=6,resave=2,checkfails=1,medical=1")
+    parser.add_argument('--take-seconds', type=float, default=8)
+    parser.add_argument('--sample-rate', type=int, default=48000)
+    parser.add_argument('--drop-ratio', type=float, default=0.3, help="share of takes with frame drops")
+    parser.add_argument('--target-sr', type=int, default=16000, help="frequency asked for by medical submissions")
+    parser.add_argument('--timeout', type=float, default=120, help="per request, seconds")
+    parser.add_argument('--url', help="load an already running server instead of starting one with fakes")
+    parser.add_argument('--port', type=int, default=8790)
+    parser.add_argument('--s3-port', type=int, default=5055)
+    parser.add_argument('--smtp-port', type=int, default=8025)
+    parser.add_argument('--mongodb-uri', default='mongomock://')
+    parser.add_argument('--server-env', action='append', default=[], metavar='KEY=VALUE',
+                        help="extra environment for the server, e.g. ANALYSIS_WORKERS=4")
+    parser.add_argument('--ready-timeout', type=float, default=180)
+    parser.add_argument('--knee-gain', type=float, default=0.1)
+    parser.add_argument('--max-error-rate', type=float, default=0.05,
+                        help="stop stepping up once a step's error rate is above this")
+    parser.add_argument('--out', help="also write the JSON report here")
+    args = parser.parse_args(argv)
+
+    takes = [
+        make_take(args.take_seconds, args.sample_rate, 3 if i < round(10 * args.drop_ratio) else 0, seed=i)
+        for i in range(10)
+    ]
+
+    workdir = tempfile.mkdtemp(prefix='loadtest-')
+    s3_server = smtp_sink = app_server = log = None
+    base_url = args.url.rstrip('/') if args.url else f"http://127.0.0.1:{args.port}"
+    steps = []
+    try:
+        if not args.url:
+            s3_server = start_s3(args.s3_port)
+            smtp_sink = SMTPSink(args.smtp_port)
+            smtp_sink.start()
+            app_server, log = start_app(args.port, workdir, args)
+        wait_ready(base_url, args.ready_timeout)
+
+        for step, concurrency in enumerate(args.concurrency):
+            report = run_step(step, concurrency, args, takes, base_url)
+            steps.append(report)
+            print(
+                f"concurrency {concurrency}: {report['throughput_per_second']:.2f} req/s, "
+                f"p95 {report.get('latency_ms', {}).get('p95', float('nan')):.0f} ms, "
+                f"errors {report['error_rate']:.1%}, 503s {report['rejected_rate']:.1%}",
+                file=sys.stderr, flush=True
+            )
+            if report['error_rate'] > args.max_error_rate:
+                break
+    finally:
+        if app_server is not None:
+            app_server.terminate()
+            app_server.wait(timeout=60)
+            log.close()
+        if smtp_sink is not None:
+            smtp_sink.stop()
+        if s3_server is not None:
+            s3_server.stop()
+
+    result = {
+        'target': base_url,
+        'mix': args.mix,
+        'take_seconds': args.take_seconds,
+        'sample_rate': args.sample_rate,
+        'stage_seconds': args.stage_seconds,
+        'knee_concurrency': find_knee(steps, args.knee_gain, args.max_error_rate),
+        'emails_received': smtp_sink.messages if smtp_sink else None,
+        'server_log': None if args.url else os.path.join(workdir, 'server.log'),
+        'steps': steps
+    }
+    output = json.dumps(result, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(output + '\n')
+    print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+import smtplib
+import threading
+import time
+
+
+def is_transient(exc):
+    """SMTP failures worth retrying on a fresh connection: drops, timeouts and 4xx replies"""
+    if isinstance(exc, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError)):
+        return True
+    if isinstance(exc, smtplib.SMTPResponseException):
+        return 400 <= exc.smtp_code < 500
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in exc.recipients.values())
+    if isinstance(exc, smtplib.SMTPException):
+        return False
+    return isinstance(exc, OSError)
+
+
+class SMTPMailer:
+    """
+    Sends batches of messages over one authenticated SMTP connection. The
+    connection is kept open between batches and checked with NOOP before
+    reuse, so each worker process pays one TLS handshake and login rather
+    than one per recipient. Transient failures reconnect and resume from the
+    first unsent message, up to max_attempts.
+    """
+
+    def __init__(self, host, port, username=None, password=None, starttls=True,
+                 timeout=30, max_attempts=3, retry_delay=1.0):
+        self.host = host
+        self.port = int(port) if port else 0
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._server = None
+        self._lock = threading.Lock()
+
+    def send(self, messages):
+        """Send (EmailMessage, to_addrs) pairs; to_addrs None uses the message headers"""
+        with self._lock:
+            sent = 0
+            attempt = 0
+            while sent < len(messages):
+                try:
+                    server = self._connection()
+                    for message, to_addrs in messages[sent:]:
+                        server.send_message(message, to_addrs=to_addrs)
+                        sent += 1
+                except Exception as e:
+                    self._disconnect()
+                    attempt += 1
+                    if not is_transient(e) or attempt >= self.max_attempts:
+                        raise
+                    print(f"SMTP attempt {attempt} failed ({e}), retrying")
+                    time.sleep(self.retry_delay * 2 ** (attempt - 1))
+            return sent
+
+    def close(self):
+        with self._lock:
+            if self._server is not None:
+                try:
+                    self._server.quit()
+                except smtplib.SMTPException:
+                    pass
+                self._server = None
+
+    def _connection(self):
+        if self._server is not None:
+            try:
+                if self._server.noop()[0] == 250:
+                    return self._server
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._disconnect()
+
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                server.starttls()
+            if self.username:
+                server.login(self.username, self.password)
+        except Exception:
+            server.close()
+            raise
+        self._server = server
+        return server
+
+    def _disconnect(self):
+        if self._server is not None:
+            try:
+                self._server.close()
+            except OSError:
+                pass
+            self._server = None
@@ -0,0 +1,77 @@
+"""
+Prometheus metrics for the upload pipeline.
+
+Stages are recorded in the web process and in the job workers (analysis pool
+workers return their timings to the caller instead), so metrics use
+prometheus_client's multiprocess mode.
+Every process writes its samples to PROMETHEUS_MULTIPROC_DIR, and /metrics
+merges them. If the variable is not set, the first process to import this
+module creates a private directory and exports it to its children. That
+directory is removed at exit. When several uvicorn workers should share one
+view, set PROMETHEUS_MULTIPROC_DIR yourself and empty it before each start.
+"""
+import asyncio
+import atexit
+import os
+import shutil
+import tempfile
+
+if not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="audio-metrics-")
+    atexit.register(shutil.rmtree, os.environ["PROMETHEUS_MULTIPROC_DIR"], True)
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Gauge, Histogram, generate_latest  # noqa: E402
+from prometheus_client import multiprocess  # noqa: E402
+
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# stage: body_parse, base64_decode, temp_write, job_spool_write, analyze, image,
+# resample, s3_upload_<object>, mongo_write, email_send
+STAGE_SECONDS = Histogram(
+    'audio_pipeline_stage_seconds',
+    'Time spent in each stage of the upload pipeline',
+    ['stage'],
+    buckets=STAGE_BUCKETS
+)
+REQUEST_SECONDS = Histogram(
+    'http_request_duration_seconds',
+    'Request latency by route',
+    ['endpoint', 'method', 'status'],
+    buckets=STAGE_BUCKETS
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    'http_requests_in_flight',
+    'Requests being handled, by route',
+    ['endpoint'],
+    multiprocess_mode='livesum'
+)
+EVENT_LOOP_LAG_SECONDS = Histogram(
+    'event_loop_lag_seconds',
+    'How late the event loop wakes a task that asked to sleep for a fixed interval',
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+)
+
+
+def stage_timer(stage):
+    """Context manager (or decorator) that records the time spent in a pipeline stage"""
+    return STAGE_SECONDS.labels(stage).time()
+
+
+def observe_stage(stage, seconds):
+    STAGE_SECONDS.labels(stage).observe(seconds)
+
+
+async def monitor_event_loop_lag(interval=0.5):
+    """Sleep for interval and record how much later than that the loop woke us, forever"""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG_SECONDS.observe(max(0.0, loop.time() - start - interval))
+
+
+def render_metrics():
+    """The merged samples of every process, in the Prometheus text format: (body, content type)"""
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,156 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+
+def create_mongo_client(url, max_pool_size=100, server_selection_timeout_ms=30000,
+                        connect_timeout_ms=20000, socket_timeout_ms=None):
+    """
+    Build the MongoDB client with a tunable connection pool and timeouts.
+    A mongomock:// URL returns an in-memory stand-in so the app runs offline.
+    """
+    if url and url.startswith("mongomock://"):
+        import mongomock
+        return mongomock.MongoClient()
+
+    from pymongo import MongoClient
+
+    return MongoClient(
+        url,
+        maxPoolSize=max_pool_size,
+        serverSelectionTimeoutMS=server_selection_timeout_ms,
+        connectTimeoutMS=connect_timeout_ms,
+        socketTimeoutMS=socket_timeout_ms
+    )
+
+
+class AsyncCollection:
+    """
+    Awaitable facade over a pymongo collection. Every call runs on a dedicated
+    I/O thread pool, so database round trips never block the Quart event loop.
+    Code that already runs off the loop (e.g. email threads) can use .sync directly.
+    """
+
+    def __init__(self, collection, executor):
+        self.sync = collection
+        self._executor = executor
+
+    async def _run(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+    async def insert_one(self, document, **kwargs):
+        return await self._run(self.sync.insert_one, document, **kwargs)
+
+    async def find_one(self, filter=None, *args, **kwargs):
+        return await self._run(self.sync.find_one, filter, *args, **kwargs)
+
+    async def update_one(self, filter, update, **kwargs):
+        return await self._run(self.sync.update_one, filter, update, **kwargs)
+
+    async def find_one_and_update(self, filter, update, *args, **kwargs):
+        return await self._run(self.sync.find_one_and_update, filter, update, *args, **kwargs)
+
+    async def find(self, filter=None, *args, **kwargs):
+        """Run the query and return all matching documents as a list"""
+        return await self._run(lambda: list(self.sync.find(filter, *args, **kwargs)))
+
+
+class BulkWriter:
+    """
+    Write-behind buffer for a pymongo collection: inserts from concurrent requests
+    are queued and sent together in one unordered bulk_write, flushed once
+    max_batch writes are waiting or max_delay seconds after the first one.
+    Each caller still awaits its own write and only returns once the batch
+    holding it has been acknowledged (or gets that write's error), so a request
+    never reports success for data the server has not accepted.
+    """
+
+    def __init__(self, collection, executor, max_batch=100, max_delay=0.02):
+        self.collection = collection
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._executor = executor
+        self._pending = []
+        self._timer = None
+        self._writes = set()
+
+    async def insert_one(self, document):
+        """Queue an insert; returns the document's _id once it is written"""
+        from bson import ObjectId
+        from pymongo import InsertOne
+
+        document.setdefault('_id', ObjectId())
+        await self._submit(InsertOne(document))
+        return document['_id']
+
+    async def flush(self):
+        """Send everything queued and wait for all batches in flight"""
+        self._flush_pending()
+        if self._writes:
+            await asyncio.gather(*self._writes, return_exceptions=True)
+
+    async def _submit(self, operation):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((operation, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush_pending()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self._flush_pending)
+        return await future
+
+    def _flush_pending(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._write(batch))
+            self._writes.add(task)
+            task.add_done_callback(self._writes.discard)
+
+    async def _write(self, batch):
+        from pymongo.errors import BulkWriteError, WriteError
+
+        loop = asyncio.get_running_loop()
+        operations = [operation for operation, _ in batch]
+        write_errors = {}
+        try:
+            await loop.run_in_executor(
+                self._executor, functools.partial(self.collection.bulk_write, operations, ordered=False)
+            )
+        except BulkWriteError as e:
+            if e.details.get('writeConcernErrors'):
+                self._fail(batch, e)
+                return
+            write_errors = {error['index']: error for error in e.details.get('writeErrors', [])}
+        except Exception as e:
+            self._fail(batch, e)
+            return
+
+        for index, (_, future) in enumerate(batch):
+            if future.done():
+                continue
+            error = write_errors.get(index)
+            if error is not None:
+                future.set_exception(WriteError(error.get('errmsg'), error.get('code'), error))
+            else:
+                future.set_result(None)
+
+    @staticmethod
+    def _fail(batch, exc):
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(exc)
+
+
+def ensure_indexes(collection, indexes):
+    """Create any missing indexes (create_index is a no-op for an existing one)"""
+    for keys in indexes:
+        collection.create_index(keys)
+
+
+def create_io_executor(max_workers):
+    """Thread pool reserved for blocking database calls"""
+    return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="mongo-io")
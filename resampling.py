@@ -0,0 +1,60 @@
+import threading
+from io import BytesIO
+import numpy as np
+import soundfile as sf
+from audio_analysis import open_audio_source
+
+# soxr quality presets: 'QQ' (quick), 'LQ', 'MQ', 'HQ' (librosa's default), 'VHQ'
+RESAMPLE_QUALITY = 'HQ'
+RESAMPLE_BLOCK_FRAMES = 64 * 1024
+
+_plans = threading.local()
+
+
+def resampler_plan(orig_sr, target_sr, quality=RESAMPLE_QUALITY):
+    """
+    Cached mono float32 soxr stream for an (orig_sr, target_sr, quality) triple,
+    cleared and ready for a new signal. Plans are per thread, as a stream keeps
+    state between chunks.
+    """
+    import soxr
+
+    cache = _plans.__dict__.setdefault('streams', {})
+    key = (orig_sr, target_sr, quality)
+    stream = cache.get(key)
+    if stream is None:
+        stream = cache[key] = soxr.ResampleStream(orig_sr, target_sr, 1, dtype='float32', quality=quality)
+    else:
+        stream.clear()
+    return stream
+
+
+def resample_blocks(blocks, orig_sr, target_sr, quality=RESAMPLE_QUALITY):
+    """Resample an iterable of mono float32 blocks, yielding resampled blocks as they are ready"""
+    stream = resampler_plan(orig_sr, target_sr, quality)
+    for block in blocks:
+        out = stream.resample_chunk(block)
+        if len(out):
+            yield out
+    yield stream.resample_chunk(np.zeros(0, dtype=np.float32), last=True)
+
+
+def resample_audio(source, target_sr, quality=RESAMPLE_QUALITY, blocksize=RESAMPLE_BLOCK_FRAMES):
+    """
+    Resample a recording (path or WAV bytes) to a mono target_sr PCM_16 WAV and
+    return it as bytes; the submission job worker calls it before the S3 uploads.
+    The input is read and resampled block by block in float32, but the encoded
+    output is held whole in a BytesIO, so memory still grows with the output size
+    (about 2 bytes per output sample).
+    """
+    converted = BytesIO()
+    with sf.SoundFile(open_audio_source(source)) as f:
+        # Convert to mono by keeping the first channel, as before
+        blocks = (
+            np.ascontiguousarray(block[:, 0])
+            for block in f.blocks(blocksize=blocksize, dtype='float32', always_2d=True)
+        )
+        with sf.SoundFile(converted, 'w', samplerate=target_sr, channels=1, format='WAV', subtype='PCM_16') as out:
+            for chunk in resample_blocks(blocks, f.samplerate, target_sr, quality):
+                out.write(chunk)
+    return converted.getvalue()
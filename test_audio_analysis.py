@@ -0,0 +1,86 @@
+"""
+The analysis STFT runs in float32 (ANALYSIS_DTYPE). These tests check, on a fixed
+synthetic corpus, that it makes the same decisions as the float64 pipeline:
+the same drops (start and end) and the same is_clean, for both analyze_audio and
+analyze_audio_stream.
+
+    python -m pytest -q test_audio_analysis.py
+"""
+import numpy as np
+import pytest
+import soundfile as sf
+from audio_analysis import AudioAnalysis, analyze_audio, analyze_audio_stream
+from bench_analysis import synthesize
+
+# (duration, sample rate, subtype, channels, clicks); the 12 s takes span three stream blocks
+CORPUS = [
+    (3, 44100, 'PCM_16', 1, 0),
+    (3, 44100, 'PCM_16', 1, 4),
+    (3, 48000, 'PCM_16', 1, 0),
+    (3, 48000, 'PCM_24', 2, 3),
+    (12, 48000, 'PCM_16', 1, 6),
+    (12, 48000, 'FLOAT', 1, 6),
+    (3, 96000, 'PCM_16', 1, 2),
+]
+
+ANALYSES = {
+    'analyze_audio': lambda path, dtype: analyze_audio(AudioAnalysis(path, dtype=dtype)),
+    'analyze_audio_stream': lambda path, dtype: analyze_audio_stream(path, dtype=dtype)
+}
+
+
+def decisions(results):
+    return [(drop['start'], drop['end']) for drop in results['drops']], results['is_clean']
+
+
+@pytest.fixture(scope='module', params=CORPUS, ids=lambda spec: '{}s_{}_{}_{}ch_{}clicks'.format(*spec))
+def recording(request, tmp_path_factory):
+    duration, sr, subtype, channels, clicks = request.param
+    path = str(tmp_path_factory.mktemp('corpus') / 'take.wav')
+    synthesize(path, duration, sr, subtype, channels, clicks)
+    return path, request.param
+
+
+@pytest.mark.parametrize('analysis', ANALYSES)
+def test_float32_decisions_match_float64(recording, analysis):
+    path, (duration, sr, subtype, channels, clicks) = recording
+    single = ANALYSES[analysis](path, np.float32)
+    double = ANALYSES[analysis](path, np.float64)
+
+    assert 'status' not in double, double.get('message')
+    assert decisions(single) == decisions(double)
+    # The corpus must actually exercise the detector. At 96 kHz the -80 dB floor
+    # alone sums to about 0.03 over the band, so every frame is above THRESHOLD and
+    # nothing is a drop; test_float32_decisions_match_float64_96k covers that rate.
+    if not clicks:
+        assert double['is_clean']
+    elif sr <= 48000:
+        assert double['drops'] and not double['is_clean']
+
+
+
+@pytest.fixture(scope='module')
+def graded_clicks_96k(tmp_path_factory):
+    """A 96 kHz take with clicks from full scale down to 0.02, so the click frames'
+    band energies spread from about 6 down to the 0.03 floor"""
+    path = str(tmp_path_factory.mktemp('corpus') / 'take96k.wav')
+    synthesize(path, 3, 96000, 'PCM_16', 1, 0)
+    audio, sr = sf.read(path)
+    audio[np.linspace(0.05 * len(audio), 0.95 * len(audio), 12).astype(int)] = np.geomspace(0.99, 0.02, 12)
+    sf.write(path, audio, sr, subtype='PCM_16')
+    return path
+
+
+# THRESHOLD itself sits under the 96 kHz floor, so use thresholds inside the range
+# the click frames actually span
+@pytest.mark.parametrize('threshold', [0.05, 0.1, 0.2])
+def test_float32_decisions_match_float64_96k(graded_clicks_96k, threshold):
+    energy = AudioAnalysis(graded_clicks_96k, dtype=np.float64).high_freq_energy
+    assert np.any(energy > threshold) and np.any(energy <= threshold)
+
+    for analyze in (lambda dtype: analyze_audio(AudioAnalysis(graded_clicks_96k, threshold=threshold, dtype=dtype)),
+                    lambda dtype: analyze_audio_stream(graded_clicks_96k, threshold=threshold, dtype=dtype)):
+        single, double = analyze(np.float32), analyze(np.float64)
+        assert 'status' not in double, double.get('message')
+        assert double['drops']
+        assert decisions(single) == decisions(double)